@@ -19,9 +19,47 @@ Use --dry-run to see what would be done without making changes.
 import sys
 from datetime import datetime, timezone
 
-import boto3
 import click
-import requests
+
+# boto3 and requests are imported inside the steps that call them so that
+# --help and --dry-run don't pay for loading the SDKs.
+
+# Throttled or unavailable calls are retried with backoff instead of aborting
+# a half-finished onboarding. POST /users isn't idempotent, so HTTP calls are
+# only retried on statuses that mean the server rejected the request unprocessed.
+AWS_MAX_ATTEMPTS = 10
+HTTP_RETRY_STATUSES = (429, 503)
+
+
+def _aws_client_config():
+    """botocore config with adaptive retries (exponential backoff + client-side rate limiting)."""
+    from botocore.config import Config
+
+    return Config(retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "adaptive"})
+
+
+def _http_session():
+    """requests session that retries POSTs on throttling/unavailable responses and connection errors.
+
+    Read errors are not retried: the request may already have created the user.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=5,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 @click.command()
@@ -37,6 +75,7 @@ import requests
 @click.option("--satvos-api-url", default=None, help="SATVOS API URL for creating service account (optional)")
 @click.option("--satvos-admin-token", default=None, help="Admin bearer token for SATVOS API (optional)")
 @click.option("--skip-service-account", is_flag=True, help="Skip SATVOS service account creation")
+@click.option("--force", is_flag=True, help="Overwrite an existing tenant config and SES receipt rule")
 @click.option("--dry-run", is_flag=True, help="Show what would be done without making changes")
 def onboard_tenant(
     tenant_slug,
@@ -51,6 +90,7 @@ def onboard_tenant(
     satvos_api_url,
     satvos_admin_token,
     skip_service_account,
+    force,
     dry_run,
 ):
     """Onboard a new tenant for the SES invoice processor."""
@@ -65,14 +105,26 @@ def onboard_tenant(
         click.echo("  MODE: DRY RUN (no changes will be made)")
     click.echo(f"{'=' * 60}\n")
 
+    already_exists = f"Tenant '{tenant_slug}' already exists in {dynamodb_table}; rerun with --force to overwrite it"
+    if not dry_run:
+        import boto3
+        from botocore.exceptions import ClientError
+
+        dynamodb = boto3.resource("dynamodb", region_name=aws_region, config=_aws_client_config())
+        table = dynamodb.Table(dynamodb_table)
+        # Refuse to clobber an existing tenant (and its credentials) unless --force is given;
+        # checked before any SES changes so a rerun stops before it half-applies
+        if not force and "Item" in table.get_item(Key={"tenant_slug": tenant_slug}, ProjectionExpression="tenant_slug"):
+            raise click.ClickException(already_exists)
+
     # Step 1: SES domain verification
     click.echo("Step 1: SES Domain Verification")
     click.echo("-" * 40)
-    ses = boto3.client("ses", region_name=aws_region)
 
     if dry_run:
         click.echo(f"  [DRY RUN] Would verify domain identity: {domain}")
     else:
+        ses = boto3.client("ses", region_name=aws_region, config=_aws_client_config())
         resp = ses.verify_domain_identity(Domain=domain)
         verification_token = resp["VerificationToken"]
         click.echo(f"  Domain identity created: {domain}")
@@ -109,8 +161,14 @@ def onboard_tenant(
         click.echo(f"    Recipient: {recipient}")
         click.echo(f"    S3 prefix: ses-inbound/{tenant_slug}/")
     else:
-        ses.create_receipt_rule(RuleSetName=ses_rule_set, Rule=rule)
-        click.echo(f"  Receipt rule created: {rule_name}")
+        try:
+            ses.create_receipt_rule(RuleSetName=ses_rule_set, Rule=rule)
+            click.echo(f"  Receipt rule created: {rule_name}")
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] != "AlreadyExists" or not force:
+                raise
+            ses.update_receipt_rule(RuleSetName=ses_rule_set, Rule=rule)
+            click.echo(f"  Receipt rule updated: {rule_name}")
 
     # Step 3: DynamoDB tenant config
     click.echo(f"\nStep 3: DynamoDB Tenant Config")
@@ -135,9 +193,14 @@ def onboard_tenant(
         if api_base_url:
             click.echo(f"    api_base_url: {api_base_url}")
     else:
-        dynamodb = boto3.resource("dynamodb", region_name=aws_region)
-        table = dynamodb.Table(dynamodb_table)
-        table.put_item(Item=item)
+        # Conditional put still guards against a tenant created since the check above
+        put_kwargs = {} if force else {"ConditionExpression": "attribute_not_exists(tenant_slug)"}
+        try:
+            table.put_item(Item=item, **put_kwargs)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            raise click.ClickException(already_exists)
         click.echo(f"  Tenant config inserted into {dynamodb_table}")
 
     # Step 4: SATVOS service account (optional)
@@ -161,7 +224,7 @@ def onboard_tenant(
             click.echo(f"    email: {service_email}")
             click.echo(f"    role: manager")
         else:
-            resp = requests.post(
+            resp = _http_session().post(
                 f"{satvos_api_url}/users",
                 json=payload,
                 headers={"Authorization": f"Bearer {satvos_admin_token}"},
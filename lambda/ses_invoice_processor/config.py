@@ -6,20 +6,24 @@ from dataclasses import dataclass
 
 from .exceptions import ConfigError
 
+# SES rejects inbound messages larger than 40 MB, so by default nothing SES delivers is refused
+DEFAULT_MAX_EMAIL_SIZE_MB = 40
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Config:
     default_api_base_url: str
     ses_email_bucket: str
     ses_email_prefix: str
     dynamodb_table_name: str
     log_level: str
+    max_email_bytes: int
 
     @classmethod
     def from_env(cls) -> "Config":
         """Load configuration from environment variables.
 
-        Raises ConfigError if required variables are missing.
+        Raises ConfigError if required variables are missing or invalid.
         """
         missing = []
         for var in ("SATVOS_API_BASE_URL", "SES_EMAIL_BUCKET", "DYNAMODB_TABLE_NAME"):
@@ -29,12 +33,21 @@ class Config:
         if missing:
             raise ConfigError(f"Missing required environment variables: {', '.join(missing)}")
 
+        raw_max_email_mb = os.environ.get("MAX_EMAIL_SIZE_MB", str(DEFAULT_MAX_EMAIL_SIZE_MB))
+        try:
+            max_email_mb = int(raw_max_email_mb)
+            if max_email_mb <= 0:
+                raise ValueError(max_email_mb)
+        except ValueError:
+            raise ConfigError(f"MAX_EMAIL_SIZE_MB must be a positive integer, got {raw_max_email_mb!r}") from None
+
         return cls(
             default_api_base_url=os.environ["SATVOS_API_BASE_URL"].rstrip("/"),
             ses_email_bucket=os.environ["SES_EMAIL_BUCKET"],
             ses_email_prefix=os.environ.get("SES_EMAIL_PREFIX", "ses-inbound").strip("/"),
             dynamodb_table_name=os.environ["DYNAMODB_TABLE_NAME"],
             log_level=os.environ.get("LOG_LEVEL", "INFO"),
+            max_email_bytes=max_email_mb * 1024 * 1024,
         )
 
     def configure_logging(self) -> logging.Logger:
@@ -46,3 +59,25 @@ class Config:
             handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
             logger.addHandler(handler)
         return logger
+
+
+# Environment variables don't change for the lifetime of a Lambda container,
+# so the parsed Config is cached after the first successful load.
+_config: Config | None = None
+
+
+def get_config() -> Config:
+    """Return the cached Config, loading it from the environment on first use.
+
+    Raises ConfigError if required variables are missing (nothing is cached).
+    """
+    global _config
+    if _config is None:
+        _config = Config.from_env()
+    return _config
+
+
+def clear_config_cache() -> None:
+    """Drop the cached Config so the next get_config() re-reads the environment (useful for testing)."""
+    global _config
+    _config = None
@@ -1,22 +1,30 @@
 """MIME email parsing, subject validation, and attachment extraction."""
 
 import email
+import email.parser
 import email.policy
-import re
+from collections.abc import Iterable
 from dataclasses import dataclass
 
 from .exceptions import NoAttachmentsError, SubjectMismatchError
 
-ALLOWED_CONTENT_TYPES: dict[str, str] = {
+# File extension for each accepted attachment content type
+_EXT_BY_TYPE: dict[str, str] = {
     "application/pdf": "pdf",
     "image/jpeg": "jpg",
     "image/png": "png",
 }
 
-_SUBJECT_PATTERN = re.compile(r"^INVOICES:\s+(.+)$", re.IGNORECASE)
+ALLOWED_CONTENT_TYPES: frozenset[str] = frozenset(_EXT_BY_TYPE)
 
+# Stateless, so one instance serves every invocation
+_PARSER = email.parser.BytesParser(policy=email.policy.default)
 
-@dataclass
+# Subjects look like "INVOICES: <company>" (case-insensitive, whitespace after the colon)
+_SUBJECT_PREFIX = "invoices:"
+
+
+@dataclass(frozen=True, slots=True)
 class Attachment:
     filename: str
     content_type: str
@@ -24,7 +32,7 @@ class Attachment:
     extension: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ParsedEmail:
     message_id: str
     subject: str
@@ -40,13 +48,29 @@ def validate_subject(subject: str | None) -> str | None:
     """
     if not subject:
         return None
-    match = _SUBJECT_PATTERN.match(subject.strip())
-    if not match:
+    subject = subject.strip()
+    if "\r" in subject or "\n" in subject:
+        return None  # a company name never spans lines
+    n = len(_SUBJECT_PREFIX)
+    if subject[:n].lower() != _SUBJECT_PREFIX or not subject[n : n + 1].isspace():
         return None
-    company_name = match.group(1).strip()
+    company_name = subject[n:].strip()
     return company_name if company_name else None
 
 
+def peek_subject(head: bytes) -> str | None:
+    """Return the Subject header from the first bytes of a raw email.
+
+    Returns "" if the header block has no Subject, or None if the header
+    block doesn't end within head (so the subject can't be known yet).
+    """
+    ends = [i for i in (head.find(b"\r\n\r\n"), head.find(b"\n\n")) if i != -1]
+    if not ends:
+        return None
+    msg = _PARSER.parsebytes(head[: min(ends)], headersonly=True)
+    return msg.get("Subject", "")
+
+
 def extract_attachments(msg: email.message.EmailMessage) -> list[Attachment]:
     """Extract PDF/JPG/PNG attachments from MIME message.
 
@@ -58,11 +82,11 @@ def extract_attachments(msg: email.message.EmailMessage) -> list[Attachment]:
 
     for part in msg.walk():
         content_type = part.get_content_type()
-        if content_type not in ALLOWED_CONTENT_TYPES:
+        ext = _EXT_BY_TYPE.get(content_type)
+        if ext is None:
             continue
 
-        disposition = part.get_content_disposition()
-        if disposition != "attachment":
+        if part.get_content_disposition() != "attachment":
             continue
 
         payload = part.get_payload(decode=True)
@@ -70,7 +94,6 @@ def extract_attachments(msg: email.message.EmailMessage) -> list[Attachment]:
             continue
 
         counter += 1
-        ext = ALLOWED_CONTENT_TYPES[content_type]
         filename = part.get_filename()
         if not filename:
             filename = f"attachment_{counter}.{ext}"
@@ -94,8 +117,23 @@ def parse_raw_email(raw_bytes: bytes) -> ParsedEmail:
         SubjectMismatchError: If subject doesn't match expected format.
         NoAttachmentsError: If no valid attachments found.
     """
-    msg = email.message_from_bytes(raw_bytes, policy=email.policy.default)
+    return _to_parsed_email(_PARSER.parsebytes(raw_bytes))
+
+
+def parse_raw_email_chunks(chunks: Iterable[bytes]) -> ParsedEmail:
+    """Parse a MIME email delivered as consecutive byte chunks (e.g. ranged S3 reads).
+
+    Raises:
+        SubjectMismatchError: If subject doesn't match expected format.
+        NoAttachmentsError: If no valid attachments found.
+    """
+    parser = email.parser.BytesFeedParser(policy=email.policy.default)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return _to_parsed_email(parser.close())
+
 
+def _to_parsed_email(msg: email.message.EmailMessage) -> ParsedEmail:
     subject = msg.get("Subject", "")
     company_name = validate_subject(subject)
     if company_name is None:
@@ -1,31 +1,70 @@
 """AWS Lambda entry point for SES inbound email invoice processing (multi-tenant)."""
 
+import functools
+import itertools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+from botocore.exceptions import BotoCoreError, ClientError
 
-from .config import Config
-from .email_parser import parse_raw_email
-from .exceptions import (
-    ConfigError,
-    NoAttachmentsError,
-    SubjectMismatchError,
-    TenantDisabledError,
-)
-from .satvos_client import SatvosClient
-from .tenant_config import TenantConfigStore, extract_tenant_slug
+from .config import Config, get_config
+from .email_parser import parse_raw_email_chunks, peek_subject, validate_subject
+from .exceptions import ConfigError, NoAttachmentsError, SubjectMismatchError
+from .satvos_client import SatvosClient, clear_token_cache
+from .tenant_config import TenantConfig, TenantConfigStore, extract_tenant_slug
 
 logger = logging.getLogger("ses_invoice_processor")
 
+# Logging only needs configuring once per Lambda container
+_logging_configured = False
+
+# SES receipt verdicts that reject an email when their status is FAIL
+_VERDICT_KEYS = ("spamVerdict", "virusVerdict")
+_MISSING_VERDICT: dict = {}
+
+# Upper bound on SES records processed concurrently in one invocation
+MAX_PARALLEL_RECORDS = 4
+
+# First ranged read of each email; enough for the header block of practically any
+# message, so bad subjects are rejected without downloading the attachments
+HEADER_PEEK_BYTES = 16 * 1024
+
+# Read size for the rest of the email; botocore's default of 1KB would mean
+# tens of thousands of parser feeds for a large message
+S3_READ_CHUNK_BYTES = 1024 * 1024
+
+
+@functools.lru_cache(maxsize=1)
+def _s3_client():
+    """Return the S3 client, created once per Lambda container."""
+    return boto3.client("s3")
+
+
+@functools.lru_cache(maxsize=None)
+def _tenant_store(table_name: str) -> TenantConfigStore:
+    """Return the TenantConfigStore for a table, created once per Lambda container."""
+    return TenantConfigStore(table_name)
+
+
+def reset_clients() -> None:
+    """Drop cached AWS clients and API tokens so the next invocation starts fresh (useful for testing)."""
+    _s3_client.cache_clear()
+    _tenant_store.cache_clear()
+    clear_token_cache()
+
 
 def lambda_handler(event: dict, context) -> dict:
     """Process an SES inbound email event.
 
     Always returns 200 to prevent SES retries. Errors are logged to CloudWatch.
     """
+    global _logging_configured
     try:
-        config = Config.from_env()
-        config.configure_logging()
+        config = get_config()
+        if not _logging_configured:
+            config.configure_logging()
+            _logging_configured = True
     except ConfigError as exc:
         # Still log even if config is broken — this is a deployment issue
         logging.basicConfig(level="ERROR")
@@ -39,61 +78,154 @@ def lambda_handler(event: dict, context) -> dict:
         return {"statusCode": 200, "body": "Internal error (logged)"}
 
 
+def _delete_email(s3, bucket: str, key: str) -> None:
+    """Best-effort delete of a stored email; failures are logged, not raised."""
+    try:
+        s3.delete_object(Bucket=bucket, Key=key)
+    except (ClientError, BotoCoreError) as exc:
+        logger.warning("Failed to delete rejected email s3://%s/%s: %s", bucket, key, exc)
+
+
+def _object_size(s3_response: dict) -> int:
+    """Total object size from a (possibly ranged) GetObject response."""
+    content_range = s3_response.get("ContentRange")
+    if content_range:
+        return int(content_range.rpartition("/")[2])
+    return s3_response.get("ContentLength", 0)
+
+
+def _failed_verdict(receipt: dict) -> str | None:
+    """Return the first SES verdict key whose status is FAIL, if any."""
+    for verdict_key in _VERDICT_KEYS:
+        if receipt.get(verdict_key, _MISSING_VERDICT).get("status") == "FAIL":
+            return verdict_key
+    return None
+
+
 def _process_event(event: dict, config: Config) -> dict:
-    """Inner processing logic, separated for testability."""
-    # Extract SES event data
-    ses_record = event["Records"][0]["ses"]
+    """Inner processing logic, separated for testability.
+
+    Each SES record is processed independently; the response body holds one
+    line per record.
+    """
+    records = [record["ses"] for record in event["Records"]]
+    slugs = [extract_tenant_slug(r["receipt"].get("recipients", [])) for r in records]
+
+    # Resolve every tenant up front: one Scan preloads all known tenants, and any still
+    # missing (e.g. onboarded since) are fetched together with one BatchGetItem.
+    # Records that fail the verdict checks are rejected without a lookup.
+    wanted = sorted({
+        slug for ses_record, slug in zip(records, slugs)
+        if slug is not None and _failed_verdict(ses_record["receipt"]) is None
+    })
+    tenants: dict[str, TenantConfig | None] = {}
+    if wanted:
+        store = _tenant_store(config.dynamodb_table_name)
+        store.preload()
+        tenants = store.get_many(wanted)
+
+    # Create the S3 client here, not in the workers: lru_cache doesn't stop two
+    # threads from building it at once on a cold start
+    s3 = _s3_client() if any(slug is not None for slug in slugs) else None
+
+    def process(ses_record: dict, tenant_slug: str | None) -> str:
+        try:
+            return _process_record(ses_record, tenant_slug, tenants.get(tenant_slug), s3, config)
+        except Exception:
+            logger.exception("Unexpected error processing SES record")
+            return "Internal error (logged)"
+
+    if len(records) == 1:
+        bodies = [process(records[0], slugs[0])]
+    else:
+        # Records are independent and I/O bound, so overlap their S3 and API calls
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_RECORDS, len(records))) as pool:
+            bodies = list(pool.map(process, records, slugs))
+    return {"statusCode": 200, "body": "\n".join(bodies)}
+
+
+def _process_record(
+    ses_record: dict, tenant_slug: str | None, tenant_config: TenantConfig | None, s3, config: Config
+) -> str:
+    """Process one SES record and return its summary line."""
     mail = ses_record["mail"]
     receipt = ses_record["receipt"]
     message_id = mail["messageId"]
 
     logger.info("Processing email message_id=%s from=%s", message_id, mail.get("source", "unknown"))
 
-    # Extract tenant from recipients
     recipients = receipt.get("recipients", [])
-    tenant_slug = extract_tenant_slug(recipients)
     if tenant_slug is None:
         logger.warning("No valid tenant found in recipients: %s", recipients)
-        return {"statusCode": 200, "body": "Ignored: no matching tenant recipient"}
+        return "Ignored: no matching tenant recipient"
 
     logger.info("Extracted tenant_slug=%s from recipients", tenant_slug)
 
-    # Look up tenant config in DynamoDB
-    store = TenantConfigStore(config.dynamodb_table_name)
-    try:
-        tenant_config = store.get(tenant_slug)
-    except TenantDisabledError:
-        logger.warning("Tenant '%s' is disabled, skipping", tenant_slug)
-        return {"statusCode": 200, "body": f"Ignored: tenant '{tenant_slug}' is disabled"}
+    # Check spam/virus verdicts before any DynamoDB or S3 reads; rejected emails are
+    # deleted so they don't accumulate in the bucket
+    s3_key = f"{config.ses_email_prefix}/{tenant_slug}/{message_id}"
+    verdict_key = _failed_verdict(receipt)
+    if verdict_key is not None:
+        logger.warning("Email %s rejected: %s=FAIL", message_id, verdict_key)
+        _delete_email(s3, config.ses_email_bucket, s3_key)
+        return f"Rejected: {verdict_key} FAIL"
 
     if tenant_config is None:
         logger.warning("Tenant '%s' not found in config store", tenant_slug)
-        return {"statusCode": 200, "body": f"Ignored: tenant '{tenant_slug}' not configured"}
+        return f"Ignored: tenant '{tenant_slug}' not configured"
 
-    # Check spam/virus verdicts
-    for verdict_key in ("spamVerdict", "virusVerdict"):
-        verdict = receipt.get(verdict_key, {})
-        if verdict.get("status") == "FAIL":
-            logger.warning("Email %s rejected: %s=FAIL", message_id, verdict_key)
-            return {"statusCode": 200, "body": f"Rejected: {verdict_key} FAIL"}
+    if not tenant_config.enabled:
+        logger.warning("Tenant '%s' is disabled, skipping", tenant_slug)
+        return f"Ignored: tenant '{tenant_slug}' is disabled"
 
     # Fetch raw email from S3 (key is <prefix>/<tenant>/<messageId>)
-    s3 = boto3.client("s3")
-    s3_key = f"{config.ses_email_prefix}/{tenant_slug}/{message_id}"
     logger.info("Fetching email from s3://%s/%s", config.ses_email_bucket, s3_key)
 
-    s3_response = s3.get_object(Bucket=config.ses_email_bucket, Key=s3_key)
-    raw_bytes = s3_response["Body"].read()
-
-    # Parse email
     try:
-        parsed = parse_raw_email(raw_bytes)
+        s3_response = s3.get_object(
+            Bucket=config.ses_email_bucket, Key=s3_key, Range=f"bytes=0-{HEADER_PEEK_BYTES - 1}"
+        )
+    except ClientError as exc:
+        # S3 can't satisfy any byte range of a 0-byte object
+        if exc.response["Error"]["Code"] != "InvalidRange":
+            raise
+        logger.warning("Email %s rejected: stored object is empty", message_id)
+        return "Ignored: empty email"
+
+    # Reject oversized emails before any more of the body is downloaded
+    size = _object_size(s3_response)
+    if size > config.max_email_bytes:
+        s3_response["Body"].close()
+        logger.warning("Email %s rejected: %d bytes exceeds limit of %d", message_id, size, config.max_email_bytes)
+        return "Rejected: email too large"
+
+    # Check the subject from the headers alone before fetching the rest of the email
+    head = s3_response["Body"].read()
+    subject = peek_subject(head)
+    if subject is not None and validate_subject(subject) is None:
+        logger.info("Ignoring email (subject mismatch): %r", subject)
+        return "Ignored: subject mismatch"
+
+    chunks = [head]
+    if len(head) < size:
+        # IfMatch makes S3 refuse the read if the object changed since the first range
+        rest = s3.get_object(
+            Bucket=config.ses_email_bucket,
+            Key=s3_key,
+            Range=f"bytes={len(head)}-",
+            IfMatch=s3_response["ETag"],
+        )
+        chunks = itertools.chain(chunks, rest["Body"].iter_chunks(chunk_size=S3_READ_CHUNK_BYTES))
+
+    # Feed the parser chunk by chunk to avoid holding a second full copy of the email
+    try:
+        parsed = parse_raw_email_chunks(chunks)
     except SubjectMismatchError as exc:
         logger.info("Ignoring email (subject mismatch): %s", exc)
-        return {"statusCode": 200, "body": "Ignored: subject mismatch"}
+        return "Ignored: subject mismatch"
     except NoAttachmentsError as exc:
         logger.info("Ignoring email (no attachments): %s", exc)
-        return {"statusCode": 200, "body": "Ignored: no attachments"}
+        return "Ignored: no attachments"
 
     logger.info(
         "Parsed email: company=%s, attachments=%d, sender=%s",
@@ -117,5 +249,4 @@ def _process_event(event: dict, config: Config) -> dict:
         f"documents_failed={len(result.documents_failed)}"
     )
     logger.info(summary)
-
-    return {"statusCode": 200, "body": summary}
+    return summary
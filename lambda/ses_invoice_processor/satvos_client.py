@@ -1,24 +1,84 @@
 """HTTP client for the SATVOS backend API."""
 
+import bisect
+import hashlib
+import io
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.fields import RequestField
+from urllib3.filepost import choose_boundary
+from urllib3.util.retry import Retry
 
 from .exceptions import AuthenticationError, SatvosAPIError
 
 logger = logging.getLogger("ses_invoice_processor")
 
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_BUFFER_SECONDS = 60
 
-@dataclass
+# Upper bound on concurrent create_document calls per email
+MAX_PARALLEL_REQUESTS = 8
+
+# Target aggregate attachment size per batch upload request, and how many such
+# requests may be in flight at once for large emails
+UPLOAD_GROUP_BYTES = 16 * 1024 * 1024
+MAX_PARALLEL_UPLOADS = 4
+
+# Longest Retry-After wait honoured; the server's value could otherwise outlast the Lambda timeout
+MAX_RETRY_AFTER_SECONDS = 10
+
+
+class _CappedRetry(Retry):
+    """Retry that honours Retry-After, but never waits longer than MAX_RETRY_AFTER_SECONDS."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER_SECONDS)
+
+
+# Only retry responses that mean the request was not processed, so repeating a POST
+# can't create duplicates. Read errors are never retried for the same reason.
+_RETRY = _CappedRetry(
+    total=3,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+
+# Tokens from earlier invocations in this Lambda container, keyed by
+# (base_url, tenant_slug, email, password digest), so warm invocations can skip
+# the login call and a changed password never matches a stale entry
+_token_cache: dict[tuple[str, str, str, str], "TokenPair"] = {}
+_token_cache_lock = threading.Lock()
+
+
+def clear_token_cache() -> None:
+    """Forget tokens cached across clients (useful for testing)."""
+    with _token_cache_lock:
+        _token_cache.clear()
+
+
+@dataclass(slots=True)
 class TokenPair:
     access_token: str
     refresh_token: str
-    expires_at: datetime
+    expires_at_epoch: float
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcessingResult:
     collection_id: str
     collection_name: str
@@ -28,6 +88,85 @@ class ProcessingResult:
     documents_failed: list[str] = field(default_factory=list)
 
 
+def _parse_expiry(expires_at: str) -> float:
+    """Convert an ISO 8601 expiry (UTC if no offset is given) to epoch seconds."""
+    expires = datetime.fromisoformat(expires_at)
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.timestamp()
+
+
+def _group_attachments(attachments: list, target_bytes: int) -> list[list]:
+    """Split attachments, in order, into groups of at most target_bytes (or a single larger file)."""
+    groups: list[list] = []
+    current: list = []
+    size = 0
+    for att in attachments:
+        if current and size + len(att.data) > target_bytes:
+            groups.append(current)
+            current, size = [], 0
+        current.append(att)
+        size += len(att.data)
+    if current:
+        groups.append(current)
+    return groups
+
+
+class _MultipartBody:
+    """Streaming multipart/form-data body over in-memory attachments.
+
+    Produces the same bytes as requests' files= encoding, but reads each
+    attachment in place instead of first copying everything into one buffer.
+    Seekable, so urllib3 can rewind it when retrying a request.
+    """
+
+    def __init__(self, field_name: str, attachments: list, boundary: str | None = None):
+        boundary = boundary or choose_boundary()
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        segments: list[bytes] = []
+        for att in attachments:
+            field = RequestField(name=field_name, data=b"", filename=att.filename)
+            field.make_multipart(content_type=att.content_type)
+            segments.append(f"--{boundary}\r\n{field.render_headers()}".encode())
+            segments.append(att.data)
+            segments.append(b"\r\n")
+        segments.append(f"--{boundary}--\r\n".encode())
+
+        self._segments = [memoryview(seg) for seg in segments if seg]
+        self._starts: list[int] = []
+        total = 0
+        for seg in self._segments:
+            self._starts.append(total)
+            total += len(seg)
+        self._len = total
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("only absolute seeks are supported")
+        self._pos = min(max(offset, 0), self._len)
+        return self._pos
+
+    def read(self, size: int | None = -1) -> bytes:
+        end = self._len if size is None or size < 0 else min(self._len, self._pos + size)
+        # Collect zero-copy slices and join them, so each chunk is copied exactly once
+        chunks: list[memoryview] = []
+        while self._pos < end:
+            i = bisect.bisect_right(self._starts, self._pos) - 1
+            offset = self._pos - self._starts[i]
+            take = min(len(self._segments[i]) - offset, end - self._pos)
+            chunks.append(self._segments[i][offset : offset + take])
+            self._pos += take
+        return b"".join(chunks)
+
+
 class SatvosClient:
     """Client for interacting with the SATVOS backend API."""
 
@@ -35,13 +174,36 @@ class SatvosClient:
         self._base_url = base_url
         self._tenant_slug = tenant_slug
         self._session = requests.Session()
+        # Keep-alive pool large enough for the concurrent document-creation workers
+        adapter = HTTPAdapter(pool_maxsize=MAX_PARALLEL_REQUESTS, max_retries=_RETRY)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
         self._token: TokenPair | None = None
+        self._cache_key: tuple[str, str, str, str] | None = None
+        self._credentials: tuple[str, str] | None = None  # kept for one re-login if a token is rejected
+        self._refresh_at = 0.0  # epoch seconds after which the access token is refreshed
+        self._auth_lock = threading.Lock()
 
     def authenticate(self, email: str, password: str) -> None:
         """Authenticate with the SATVOS API and store tokens.
 
+        Reuses a token cached by an earlier client for the same user if it is
+        still outside the refresh window.
+
         Raises AuthenticationError on failure.
         """
+        password_digest = hashlib.sha256(password.encode()).hexdigest()
+        self._cache_key = (self._base_url, self._tenant_slug, email, password_digest)
+        self._credentials = (email, password)
+        with _token_cache_lock:
+            cached = _token_cache.get(self._cache_key)
+        if cached is not None and time.time() < cached.expires_at_epoch - TOKEN_REFRESH_BUFFER_SECONDS:
+            self._use_token(cached)
+            return
+
+        self._login(email, password)
+
+    def _login(self, email: str, password: str) -> None:
         resp = self._session.post(
             f"{self._base_url}/auth/login",
             json={"tenant_slug": self._tenant_slug, "email": email, "password": password},
@@ -53,55 +215,90 @@ class SatvosClient:
                 response_body=resp.text,
             )
 
-        data = resp.json()["data"]
-        self._token = TokenPair(
+        self._set_token(resp.json()["data"])
+
+    def _set_token(self, data: dict) -> None:
+        """Store a login/refresh token pair and precompute when it needs refreshing."""
+        token = TokenPair(
             access_token=data["access_token"],
             refresh_token=data["refresh_token"],
-            expires_at=datetime.fromisoformat(data["expires_at"]),
+            expires_at_epoch=_parse_expiry(data["expires_at"]),
         )
-        self._session.headers["Authorization"] = f"Bearer {self._token.access_token}"
+        with _token_cache_lock:
+            _token_cache[self._cache_key] = token
+        self._use_token(token)
+
+    def _use_token(self, token: TokenPair) -> None:
+        self._token = token
+        self._session.headers["Authorization"] = f"Bearer {token.access_token}"
+        # Published last: lock-free readers in _ensure_auth must see the new header first
+        self._refresh_at = token.expires_at_epoch - TOKEN_REFRESH_BUFFER_SECONDS
 
     def _ensure_auth(self) -> None:
         """Refresh the access token if it's expired or about to expire (60s buffer)."""
         if self._token is None:
             raise AuthenticationError("Not authenticated — call authenticate() first")
 
-        now = datetime.now(timezone.utc)
-        expires = self._token.expires_at
-        if expires.tzinfo is None:
-            expires = expires.replace(tzinfo=timezone.utc)
-
-        buffer_seconds = 60
-        if (expires - now).total_seconds() > buffer_seconds:
+        if time.time() < self._refresh_at:
             return
 
-        resp = self._session.post(
-            f"{self._base_url}/auth/refresh",
-            json={"refresh_token": self._token.refresh_token},
-        )
-        if resp.status_code != 200:
-            raise AuthenticationError(
-                f"Token refresh failed: {resp.status_code}",
-                status_code=resp.status_code,
-                response_body=resp.text,
+        # Serialize refreshes when documents are created from worker threads
+        with self._auth_lock:
+            if time.time() < self._refresh_at:
+                return  # another thread refreshed while we waited
+
+            resp = self._session.post(
+                f"{self._base_url}/auth/refresh",
+                json={"refresh_token": self._token.refresh_token},
             )
+            if resp.status_code != 200:
+                raise AuthenticationError(
+                    f"Token refresh failed: {resp.status_code}",
+                    status_code=resp.status_code,
+                    response_body=resp.text,
+                )
 
-        data = resp.json()["data"]
-        self._token = TokenPair(
-            access_token=data["access_token"],
-            refresh_token=data["refresh_token"],
-            expires_at=datetime.fromisoformat(data["expires_at"]),
-        )
-        self._session.headers["Authorization"] = f"Bearer {self._token.access_token}"
+            self._set_token(resp.json()["data"])
+
+    def _relogin(self, rejected: TokenPair) -> bool:
+        """Replace an access token the API rejected with a fresh login, at most once per client.
+
+        Returns True if the caller should retry with the current token.
+        """
+        with self._auth_lock:
+            if self._token is not rejected:
+                return True  # another thread already logged in again
+            if self._credentials is None:
+                return False
+
+            with _token_cache_lock:
+                if _token_cache.get(self._cache_key) is rejected:
+                    del _token_cache[self._cache_key]
+            logger.info("Access token rejected, logging in again")
+            email, password = self._credentials
+            self._credentials = None
+            self._login(email, password)
+            return True
+
+    def _post(self, path: str, **kwargs) -> requests.Response:
+        """POST an authenticated request, logging in again once if the token is rejected (401)."""
+        self._ensure_auth()
+        token = self._token
+        resp = self._session.post(f"{self._base_url}{path}", **kwargs)
+        if resp.status_code == 401 and self._relogin(token):
+            body = kwargs.get("data")
+            if body is not None:
+                body.seek(0)
+            resp = self._session.post(f"{self._base_url}{path}", **kwargs)
+        return resp
 
     def create_collection(self, name: str, description: str) -> str:
         """Create a collection and return its ID.
 
         Raises SatvosAPIError on failure.
         """
-        self._ensure_auth()
-        resp = self._session.post(
-            f"{self._base_url}/collections",
+        resp = self._post(
+            "/collections",
             json={"name": name, "description": description},
         )
         if resp.status_code not in (200, 201):
@@ -115,20 +312,50 @@ class SatvosClient:
     def batch_upload_files(self, collection_id: str, attachments: list) -> list[dict]:
         """Upload files to a collection via multipart batch upload.
 
-        Returns the per-file results array.
+        Attachments larger than UPLOAD_GROUP_BYTES in total are split into
+        groups uploaded concurrently. A failed group's files are reported as
+        failed entries so the rest of the batch still goes through.
+
+        Returns the per-file results array, in attachment order.
         Raises SatvosAPIError on total failure.
         """
+        groups = _group_attachments(attachments, UPLOAD_GROUP_BYTES)
+        if len(groups) <= 1:
+            return self._upload_group(collection_id, attachments)
+
+        def upload(group: list) -> list[dict] | SatvosAPIError:
+            try:
+                return self._upload_group(collection_id, group)
+            except SatvosAPIError as exc:
+                return exc
+
         self._ensure_auth()
-        files = [
-            ("files", (att.filename, att.data, att.content_type))
-            for att in attachments
-        ]
-        # Remove Content-Type header so requests sets multipart boundary
-        headers = {k: v for k, v in self._session.headers.items() if k.lower() != "content-type"}
-        resp = self._session.post(
-            f"{self._base_url}/collections/{collection_id}/files",
-            files=files,
-            headers=headers,
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_UPLOADS, len(groups))) as pool:
+            outcomes = list(pool.map(upload, groups))
+
+        if all(isinstance(outcome, SatvosAPIError) for outcome in outcomes):
+            raise outcomes[0]
+
+        results: list[dict] = []
+        for group, outcome in zip(groups, outcomes):
+            if isinstance(outcome, SatvosAPIError):
+                logger.warning("Batch upload of %d files failed: %s", len(group), outcome)
+                results.extend(
+                    {"success": False, "file": {"original_name": att.filename}, "error": str(outcome)}
+                    for att in group
+                )
+            else:
+                results.extend(outcome)
+        return results
+
+    def _upload_group(self, collection_id: str, attachments: list) -> list[dict]:
+        body = _MultipartBody("files", attachments)
+        # Request headers are merged case-insensitively over the session's, so this
+        # overrides any session Content-Type without copying the session headers
+        resp = self._post(
+            f"/collections/{collection_id}/files",
+            data=body,
+            headers={"Content-Type": body.content_type},
         )
         if resp.status_code not in (200, 201, 207):
             raise SatvosAPIError(
@@ -143,9 +370,8 @@ class SatvosClient:
 
         Raises SatvosAPIError on failure.
         """
-        self._ensure_auth()
-        resp = self._session.post(
-            f"{self._base_url}/documents",
+        resp = self._post(
+            "/documents",
             json={
                 "file_id": file_id,
                 "collection_id": collection_id,
@@ -187,25 +413,40 @@ class SatvosClient:
         # Batch upload all files
         upload_results = self.batch_upload_files(collection_id, attachments)
 
-        # Create documents for each successfully uploaded file
+        uploaded: list[tuple[str, str]] = []
         for item in upload_results:
+            file_info = item.get("file") or {}
+            filename = file_info.get("original_name", "unknown")
             if not item.get("success", False):
                 error_msg = item.get("error", "unknown error")
-                filename = item.get("file", {}).get("original_name", "unknown")
                 result.files_failed.append(f"{filename}: {error_msg}")
                 logger.warning("File upload failed: %s — %s", filename, error_msg)
                 continue
 
-            result.files_uploaded += 1
-            file_id = item["file"]["id"]
-            filename = item["file"].get("original_name", "unknown")
+            uploaded.append((file_info["id"], filename))
+        result.files_uploaded = len(uploaded)
+
+        if not uploaded:
+            return result
 
+        # Create documents for each successfully uploaded file, concurrently over the shared session
+        def create(file: tuple[str, str]) -> str | SatvosAPIError:
             try:
-                doc_id = self.create_document(file_id, collection_id)
-                result.documents_created += 1
-                logger.info("Created document %s for file %s (%s)", doc_id, file_id, filename)
+                return self.create_document(file[0], collection_id)
             except SatvosAPIError as exc:
-                result.documents_failed.append(f"{filename}: {exc}")
-                logger.warning("Document creation failed for file %s: %s", filename, exc)
+                return exc
+
+        # Refresh (if needed) once up front rather than having the first worker refresh while the rest wait
+        self._ensure_auth()
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(uploaded))) as pool:
+            outcomes = list(pool.map(create, uploaded))
+
+        for (file_id, filename), outcome in zip(uploaded, outcomes):
+            if isinstance(outcome, SatvosAPIError):
+                result.documents_failed.append(f"{filename}: {outcome}")
+                logger.warning("Document creation failed for file %s: %s", filename, outcome)
+            else:
+                result.documents_created += 1
+                logger.info("Created document %s for file %s (%s)", outcome, file_id, filename)
 
         return result
@@ -1,7 +1,9 @@
 """Tenant extraction from SES recipients and DynamoDB config lookup with caching."""
 
+import functools
 import logging
-import re
+import string
+import threading
 import time
 from dataclasses import dataclass
 
@@ -11,14 +13,54 @@ from .exceptions import TenantDisabledError
 
 logger = logging.getLogger("ses_invoice_processor")
 
-# Matches invoices@<tenant>.satvos.com (tenant = lowercase alphanum + hyphens)
-_RECIPIENT_RE = re.compile(r"^invoices@([a-z0-9-]+)\.satvos\.com$", re.IGNORECASE)
+# Recipients look like invoices@<tenant>.satvos.com (tenant = lowercase alphanum + hyphens)
+_RECIPIENT_PREFIX = "invoices@"
+_RECIPIENT_SUFFIX = ".satvos.com"
+_SLUG_CHARS = frozenset(string.ascii_lowercase + string.digits + "-")
 
 CACHE_TTL_SECONDS = 300  # 5 minutes
+NEGATIVE_CACHE_TTL_SECONDS = 60  # unknown tenants are re-checked sooner
+CACHE_MAX_ENTRIES = 1024  # bound on cached tenants (including "not found" entries)
+BATCH_GET_MAX_KEYS = 100  # DynamoDB BatchGetItem limit per request
 
 # Module-level cache survives across Lambda container reuse.
-# Maps tenant_slug -> (TenantConfig, expiry_timestamp)
-_cache: dict[str, tuple["TenantConfig", float]] = {}
+# Maps tenant_slug -> (TenantConfig or None if not found, expiry_timestamp)
+_cache: dict[str, tuple["TenantConfig | None", float]] = {}
+_cache_lock = threading.Lock()
+
+# When the last full-table preload goes stale (0.0 until the first one)
+_preloaded_until = 0.0
+
+
+def _cache_put(tenant_slug: str, entry: tuple["TenantConfig | None", float]) -> None:
+    """Cache an entry, evicting the oldest-written ones beyond CACHE_MAX_ENTRIES.
+
+    Callers must hold _cache_lock; readers stay lock-free.
+    """
+    _cache.pop(tenant_slug, None)  # re-insert so dict order tracks write order
+    _cache[tenant_slug] = entry
+    while len(_cache) > CACHE_MAX_ENTRIES:
+        del _cache[next(iter(_cache))]
+
+
+def _cache_fetched(
+    tenant_slug: str, entry: tuple["TenantConfig | None", float], now: float
+) -> tuple["TenantConfig | None", float]:
+    """Cache a freshly fetched entry unless a concurrent fetch already cached a fresh one.
+
+    Returns whichever entry ends up cached. Callers must hold _cache_lock.
+    """
+    current = _cache.get(tenant_slug)
+    if current is not None and now < current[1]:
+        return current
+    _cache_put(tenant_slug, entry)
+    return entry
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_dynamodb():
+    """Return the DynamoDB resource shared by all stores, created once per Lambda container."""
+    return boto3.resource("dynamodb")
 
 
 def extract_tenant_slug(recipients: list[str]) -> str | None:
@@ -27,14 +69,23 @@ def extract_tenant_slug(recipients: list[str]) -> str | None:
     Looks for the first recipient matching invoices@<tenant>.satvos.com.
     Returns the tenant slug or None if no match found.
     """
+    return _extract_tenant_slug(tuple(recipients))
+
+
+@functools.lru_cache(maxsize=1024)
+def _extract_tenant_slug(recipients: tuple[str, ...]) -> str | None:
+    # Memoized: SES retries and replays deliver the same recipient lists repeatedly
     for addr in recipients:
-        m = _RECIPIENT_RE.match(addr.strip())
-        if m:
-            return m.group(1).lower()
+        addr = addr.strip().lower()
+        if not (addr.startswith(_RECIPIENT_PREFIX) and addr.endswith(_RECIPIENT_SUFFIX)):
+            continue
+        slug = addr[len(_RECIPIENT_PREFIX) : -len(_RECIPIENT_SUFFIX)]
+        if slug and _SLUG_CHARS.issuperset(slug):
+            return slug
     return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TenantConfig:
     tenant_slug: str
     service_email: str
@@ -57,33 +108,47 @@ class TenantConfig:
 class TenantConfigStore:
     """Fetches and caches tenant configuration from DynamoDB."""
 
-    def __init__(self, table_name: str, dynamodb_resource=None):
+    def __init__(self, table_name: str, dynamodb_resource=None, now_fn=time.monotonic):
         self._table_name = table_name
         self._dynamodb = dynamodb_resource
+        self._now = now_fn  # clock for cache expiry; injectable for tests
+        self._table = None
+
+    def _get_dynamodb(self):
+        if self._dynamodb is not None:
+            return self._dynamodb
+        return _shared_dynamodb()
 
     def _get_table(self):
-        if self._dynamodb is None:
-            self._dynamodb = boto3.resource("dynamodb")
-        return self._dynamodb.Table(self._table_name)
+        if self._table is None:
+            self._table = self._get_dynamodb().Table(self._table_name)
+        return self._table
 
     def get(self, tenant_slug: str) -> TenantConfig | None:
         """Look up tenant config, using cache if fresh.
 
-        Returns None if tenant not found in DynamoDB.
+        Returns None if tenant not found in DynamoDB (cached for NEGATIVE_CACHE_TTL_SECONDS).
         Raises TenantDisabledError if tenant exists but is disabled.
         """
-        now = time.monotonic()
+        now = self._now()
 
-        # Check cache
-        if tenant_slug in _cache:
-            config, expiry = _cache[tenant_slug]
-            if now < expiry:
+        # Check cache; on a miss, fetch without the lock so a slow read doesn't stall other tenants
+        entry = _cache.get(tenant_slug)
+        if entry is not None and now < entry[1]:
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug("Tenant config cache hit for %s", tenant_slug)
-                if not config.enabled:
-                    raise TenantDisabledError(f"Tenant '{tenant_slug}' is disabled")
-                return config
+        else:
+            entry = self._fetch(tenant_slug, now)
+            with _cache_lock:
+                entry = _cache_fetched(tenant_slug, entry, now)
+
+        config = entry[0]
+        if config is not None and not config.enabled:
+            raise TenantDisabledError(f"Tenant '{tenant_slug}' is disabled")
+        return config
 
-        # Cache miss or expired — fetch from DynamoDB
+    def _fetch(self, tenant_slug: str, now: float) -> tuple[TenantConfig | None, float]:
+        """Fetch a tenant from DynamoDB; "not found" gets the shorter negative TTL."""
         logger.info("Fetching tenant config from DynamoDB for %s", tenant_slug)
         table = self._get_table()
         resp = table.get_item(Key={"tenant_slug": tenant_slug})
@@ -91,17 +156,99 @@ class TenantConfigStore:
         item = resp.get("Item")
         if item is None:
             logger.warning("Tenant '%s' not found in DynamoDB", tenant_slug)
-            return None
+            entry = (None, now + NEGATIVE_CACHE_TTL_SECONDS)
+        else:
+            entry = (TenantConfig.from_dynamodb_item(item), now + CACHE_TTL_SECONDS)
+        return entry
 
-        config = TenantConfig.from_dynamodb_item(item)
-        _cache[tenant_slug] = (config, now + CACHE_TTL_SECONDS)
+    def get_many(self, tenant_slugs: list[str]) -> dict[str, TenantConfig | None]:
+        """Look up several tenants, fetching every cache miss with BatchGetItem.
 
-        if not config.enabled:
-            raise TenantDisabledError(f"Tenant '{tenant_slug}' is disabled")
+        Returns a mapping with an entry for each requested slug (None if not
+        found). Unlike get(), disabled tenants are returned rather than raised;
+        callers check TenantConfig.enabled.
+        """
+        now = self._now()
+        results: dict[str, TenantConfig | None] = {}
+        for slug in tenant_slugs:
+            entry = _cache.get(slug)
+            if entry is not None and now < entry[1]:
+                results[slug] = entry[0]
+
+        missing = [slug for slug in dict.fromkeys(tenant_slugs) if slug not in results]
+        if missing:
+            fetched = self._fetch_many(missing, now)
+            with _cache_lock:
+                for slug, entry in fetched.items():
+                    results[slug] = _cache_fetched(slug, entry, now)[0]
+        return results
+
+    def _fetch_many(self, tenant_slugs: list[str], now: float) -> dict[str, tuple[TenantConfig | None, float]]:
+        """Fetch tenants in BatchGetItem-sized chunks, returning a cache entry per slug."""
+        logger.info("Fetching %d tenant configs from DynamoDB", len(tenant_slugs))
+        dynamodb = self._get_dynamodb()
+        found: dict[str, TenantConfig] = {}
+        for i in range(0, len(tenant_slugs), BATCH_GET_MAX_KEYS):
+            keys = [{"tenant_slug": slug} for slug in tenant_slugs[i : i + BATCH_GET_MAX_KEYS]]
+            request = {self._table_name: {"Keys": keys}}
+            attempt = 0
+            while request:
+                if attempt:
+                    time.sleep(min(0.05 * 2**attempt, 1.0))  # back off before retrying throttled keys
+                resp = dynamodb.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(self._table_name, []):
+                    found[item["tenant_slug"]] = TenantConfig.from_dynamodb_item(item)
+                request = resp.get("UnprocessedKeys")
+                attempt += 1
+
+        entries: dict[str, tuple[TenantConfig | None, float]] = {}
+        for slug in tenant_slugs:
+            config = found.get(slug)
+            if config is None:
+                logger.warning("Tenant '%s' not found in DynamoDB", slug)
+                entries[slug] = (None, now + NEGATIVE_CACHE_TTL_SECONDS)
+            else:
+                entries[slug] = (config, now + CACHE_TTL_SECONDS)
+        return entries
+
+    def preload(self) -> None:
+        """Load every tenant's config into the cache with one Scan, at most once per CACHE_TTL_SECONDS.
+
+        Reads whole items, credentials included, like get() does. Tenants
+        added since the last Scan aren't rejected here; get() still finds them.
+        """
+        global _preloaded_until
+        now = self._now()
+        if now < _preloaded_until:
+            return
 
-        return config
+        logger.info("Scanning DynamoDB for tenant configs")
+        table = self._get_table()
+        configs: list[TenantConfig] = []
+        scan_kwargs = {}
+        while True:
+            resp = table.scan(**scan_kwargs)
+            for item in resp.get("Items", []):
+                try:
+                    configs.append(TenantConfig.from_dynamodb_item(item))
+                except KeyError as exc:
+                    # Leave it to get() so only this tenant's emails fail
+                    logger.warning("Tenant '%s' config is missing %s", item["tenant_slug"], exc)
+            if "LastEvaluatedKey" not in resp:
+                break
+            scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+        with _cache_lock:
+            if now < _preloaded_until:
+                return  # a concurrent preload finished first
+            for config in configs:
+                _cache_put(config.tenant_slug, (config, now + CACHE_TTL_SECONDS))
+            _preloaded_until = now + CACHE_TTL_SECONDS
 
     @staticmethod
     def clear_cache():
-        """Clear the module-level cache (useful for testing)."""
+        """Clear the module-level caches (useful for testing)."""
+        global _preloaded_until
         _cache.clear()
+        _preloaded_until = 0.0
+        _shared_dynamodb.cache_clear()
@@ -3,12 +3,15 @@
 import email
 import email.policy
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
 from ses_invoice_processor.email_parser import (
     extract_attachments,
     parse_raw_email,
+    parse_raw_email_chunks,
+    peek_subject,
     validate_subject,
 )
 from ses_invoice_processor.exceptions import NoAttachmentsError, SubjectMismatchError
@@ -41,6 +44,10 @@ class TestValidateSubject:
     def test_invalid_only_spaces_after_colon(self):
         assert validate_subject("INVOICES:   ") is None
 
+    @pytest.mark.parametrize("subject", ["INVOICES: A\nB", "INVOICES: A\r\nB", "INVOICES:\nAcme"])
+    def test_invalid_multi_line(self, subject):
+        assert validate_subject(subject) is None
+
     def test_invalid_empty_string(self):
         assert validate_subject("") is None
 
@@ -53,6 +60,12 @@ class TestValidateSubject:
     def test_invalid_no_colon(self):
         assert validate_subject("INVOICES Something") is None
 
+    def test_invalid_no_space_after_colon(self):
+        assert validate_subject("INVOICES:Acme") is None
+
+    def test_valid_tab_after_colon(self):
+        assert validate_subject("INVOICES:\tAcme") == "Acme"
+
 
 class TestExtractAttachments:
     def _make_email(self, parts: list[tuple[str, str, str, bytes]]) -> email.message.EmailMessage:
@@ -143,6 +156,179 @@ class TestExtractAttachments:
         assert len(attachments) == 1
         assert attachments[0].filename == "inv.pdf"
 
+    def test_nested_multipart_attachments(self):
+        """Attachments inside nested multipart containers are still found; bodies are skipped."""
+        raw = (
+            b"MIME-Version: 1.0\r\n"
+            b"Content-Type: multipart/mixed; boundary=\"outer\"\r\n"
+            b"\r\n"
+            b"--outer\r\n"
+            b"Content-Type: multipart/alternative; boundary=\"alt\"\r\n"
+            b"\r\n"
+            b"--alt\r\n"
+            b"Content-Type: text/plain\r\n"
+            b"\r\n"
+            b"See attached.\r\n"
+            b"--alt\r\n"
+            b"Content-Type: text/html\r\n"
+            b"\r\n"
+            b"<p>See attached.</p>\r\n"
+            b"--alt--\r\n"
+            b"--outer\r\n"
+            b"Content-Type: multipart/mixed; boundary=\"inner\"\r\n"
+            b"\r\n"
+            b"--inner\r\n"
+            b"Content-Type: application/pdf\r\n"
+            b"Content-Disposition: attachment; filename=\"nested.pdf\"\r\n"
+            b"Content-Transfer-Encoding: base64\r\n"
+            b"\r\n"
+            b"JVBER\r\n"
+            b"--inner--\r\n"
+            b"--outer--\r\n"
+        )
+        msg = email.message_from_bytes(raw, policy=email.policy.default)
+        attachments = extract_attachments(msg)
+        assert len(attachments) == 1
+        assert attachments[0].filename == "nested.pdf"
+
+    def test_forwarded_message_attachments(self):
+        """Attachments inside an attached message/rfc822 part are extracted."""
+        inner = self._make_email([
+            ("application/pdf", "attachment", "forwarded.pdf", b"%PDF-fwd"),
+        ])
+        msg = email.message.EmailMessage()
+        msg["Subject"] = "INVOICES: Test"
+        msg.set_content("Forwarding")
+        msg.add_attachment(inner)
+        attachments = extract_attachments(msg)
+        assert len(attachments) == 1
+        assert attachments[0].filename == "forwarded.pdf"
+        assert attachments[0].data == b"%PDF-fwd"
+
+    @pytest.mark.parametrize(
+        "raw, filename",
+        [
+            # Apple Mail: attachments inside the last alternative
+            (
+                b"MIME-Version: 1.0\r\n"
+                b"Content-Type: multipart/alternative; boundary=\"alt\"\r\n"
+                b"\r\n"
+                b"--alt\r\n"
+                b"Content-Type: text/plain\r\n"
+                b"\r\n"
+                b"See attached.\r\n"
+                b"--alt\r\n"
+                b"Content-Type: multipart/mixed; boundary=\"mix\"\r\n"
+                b"\r\n"
+                b"--mix\r\n"
+                b"Content-Type: text/html\r\n"
+                b"\r\n"
+                b"<p>See attached.</p>\r\n"
+                b"--mix\r\n"
+                b"Content-Type: application/pdf\r\n"
+                b"Content-Disposition: attachment; filename=\"a.pdf\"\r\n"
+                b"Content-Transfer-Encoding: base64\r\n"
+                b"\r\n"
+                b"JVBER\r\n"
+                b"--mix--\r\n"
+                b"--alt--\r\n",
+                "a.pdf",
+            ),
+            # Single-part message that is itself the attachment
+            (
+                b"MIME-Version: 1.0\r\n"
+                b"Content-Type: application/pdf\r\n"
+                b"Content-Disposition: attachment; filename=\"s.pdf\"\r\n"
+                b"Content-Transfer-Encoding: base64\r\n"
+                b"\r\n"
+                b"JVBER\r\n",
+                "s.pdf",
+            ),
+            # Attachment inside the multipart/related body of a mixed message
+            (
+                b"MIME-Version: 1.0\r\n"
+                b"Content-Type: multipart/mixed; boundary=\"mix\"\r\n"
+                b"\r\n"
+                b"--mix\r\n"
+                b"Content-Type: multipart/related; boundary=\"rel\"\r\n"
+                b"\r\n"
+                b"--rel\r\n"
+                b"Content-Type: text/html\r\n"
+                b"\r\n"
+                b"<p>See attached.</p>\r\n"
+                b"--rel\r\n"
+                b"Content-Type: application/pdf\r\n"
+                b"Content-Disposition: attachment; filename=\"r.pdf\"\r\n"
+                b"Content-Transfer-Encoding: base64\r\n"
+                b"\r\n"
+                b"JVBER\r\n"
+                b"--rel--\r\n"
+                b"--mix--\r\n",
+                "r.pdf",
+            ),
+            # Top-level multipart/related whose first (root) part is the attachment
+            (
+                b"MIME-Version: 1.0\r\n"
+                b"Content-Type: multipart/related; boundary=\"rel\"\r\n"
+                b"\r\n"
+                b"--rel\r\n"
+                b"Content-Type: application/pdf\r\n"
+                b"Content-Disposition: attachment; filename=\"q.pdf\"\r\n"
+                b"Content-Transfer-Encoding: base64\r\n"
+                b"\r\n"
+                b"JVBER\r\n"
+                b"--rel\r\n"
+                b"Content-Type: image/png\r\n"
+                b"Content-Disposition: inline; filename=\"logo.png\"\r\n"
+                b"Content-Transfer-Encoding: base64\r\n"
+                b"\r\n"
+                b"iVBOR\r\n"
+                b"--rel--\r\n",
+                "q.pdf",
+            ),
+        ],
+        ids=["alternative-mixed", "single-part", "mixed-related", "related"],
+    )
+    def test_attachment_found_in_any_layout(self, raw, filename):
+        msg = email.message_from_bytes(raw, policy=email.policy.default)
+        attachments = extract_attachments(msg)
+        assert [a.filename for a in attachments] == [filename]
+
+    def test_rejected_parts_not_decoded(self):
+        """Inline and unsupported parts are filtered before their payload is base64-decoded."""
+        raw = (
+            b"MIME-Version: 1.0\r\n"
+            b"Content-Type: multipart/mixed; boundary=\"bound\"\r\n"
+            b"\r\n"
+            b"--bound\r\n"
+            b"Content-Type: image/png\r\n"
+            b"Content-Disposition: inline; filename=\"logo.png\"\r\n"
+            b"Content-Transfer-Encoding: base64\r\n"
+            b"\r\n"
+            b"iVBOR\r\n"
+            b"--bound\r\n"
+            b"Content-Type: application/zip\r\n"
+            b"Content-Disposition: attachment; filename=\"archive.zip\"\r\n"
+            b"Content-Transfer-Encoding: base64\r\n"
+            b"\r\n"
+            b"UEsDBA==\r\n"
+            b"--bound\r\n"
+            b"Content-Type: application/pdf\r\n"
+            b"Content-Disposition: attachment; filename=\"inv.pdf\"\r\n"
+            b"Content-Transfer-Encoding: base64\r\n"
+            b"\r\n"
+            b"JVBER\r\n"
+            b"--bound--\r\n"
+        )
+        msg = email.message_from_bytes(raw, policy=email.policy.default)
+        get_payload = email.message.EmailMessage.get_payload
+        with patch.object(email.message.EmailMessage, "get_payload", autospec=True, side_effect=get_payload) as spy:
+            attachments = extract_attachments(msg)
+
+        decoded = [c.args[0].get_filename() for c in spy.call_args_list if c.kwargs.get("decode")]
+        assert decoded == ["inv.pdf"]
+        assert [a.filename for a in attachments] == ["inv.pdf"]
+
     def test_no_attachments(self):
         msg = email.message.EmailMessage()
         msg["Subject"] = "INVOICES: Test"
@@ -200,3 +386,30 @@ class TestParseRawEmail:
         )
         with pytest.raises(NoAttachmentsError):
             parse_raw_email(raw)
+
+
+class TestParseRawEmailChunks:
+    def test_matches_bytes_parser(self):
+        raw = (FIXTURES_DIR / "valid_email.eml").read_bytes()
+        chunks = [raw[i : i + 100] for i in range(0, len(raw), 100)]
+        assert parse_raw_email_chunks(chunks) == parse_raw_email(raw)
+
+    def test_subject_mismatch_raises(self):
+        raw = b"From: test@example.com\r\nSubject: FWD: Some invoice\r\n\r\nbody\r\n"
+        with pytest.raises(SubjectMismatchError):
+            parse_raw_email_chunks([raw[:20], raw[20:]])
+
+
+class TestPeekSubject:
+    def test_complete_headers(self):
+        head = b"From: a@example.com\r\nSubject: INVOICES: Acme\r\n\r\nbody starts"
+        assert peek_subject(head) == "INVOICES: Acme"
+
+    def test_lf_line_endings(self):
+        assert peek_subject(b"Subject: INVOICES: Acme\n\nbody") == "INVOICES: Acme"
+
+    def test_missing_subject(self):
+        assert peek_subject(b"From: a@example.com\r\n\r\nbody") == ""
+
+    def test_incomplete_headers(self):
+        assert peek_subject(b"From: a@example.com\r\nSubject: INVOICES: Ac") is None
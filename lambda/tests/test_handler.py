@@ -2,14 +2,25 @@
 
 import json
 import os
+import threading
 from unittest.mock import patch
 
 import boto3
 import pytest
 import responses
+from botocore.exceptions import EndpointConnectionError
+from botocore.response import StreamingBody
 from moto import mock_aws
 
-from ses_invoice_processor.handler import lambda_handler
+from ses_invoice_processor.config import Config, clear_config_cache, get_config
+from ses_invoice_processor.handler import (
+    HEADER_PEEK_BYTES,
+    S3_READ_CHUNK_BYTES,
+    _s3_client,
+    _tenant_store,
+    lambda_handler,
+    reset_clients,
+)
 from ses_invoice_processor.tenant_config import TenantConfigStore
 
 BASE_URL = "https://api.test.satvos.com/api/v1"
@@ -172,10 +183,15 @@ def _mock_api_calls(collection_id: str = "coll-1"):
     )
 
 
-class TestLambdaHandler:
-    def setup_method(self):
-        TenantConfigStore.clear_cache()
+@pytest.fixture(autouse=True)
+def _fresh_state():
+    """Start every test without cached config, AWS clients, tokens or tenant configs."""
+    TenantConfigStore.clear_cache()
+    reset_clients()
+    clear_config_cache()
+
 
+class TestLambdaHandler:
     @mock_aws
     @responses.activate
     def test_happy_path(self):
@@ -206,55 +222,97 @@ class TestLambdaHandler:
         body = json.loads(create_coll_call.request.body)
         assert "sender@example.com" in body["description"]
 
+    @pytest.mark.parametrize(
+        "spam_status, virus_status, expected",
+        [("FAIL", "PASS", "spamVerdict"), ("PASS", "FAIL", "virusVerdict")],
+    )
     @mock_aws
-    def test_spam_rejection(self):
+    def test_verdict_rejection(self, spam_status, virus_status, expected):
         _setup_dynamodb("passpl")
-        _setup_s3("passpl", "spam-msg", VALID_EMAIL_BYTES)
+        _setup_s3("passpl", "bad-verdict", VALID_EMAIL_BYTES)
 
         with patch.dict(os.environ, _env_vars(), clear=False):
             result = lambda_handler(
-                _ses_event("spam-msg", spam_status="FAIL"),
+                _ses_event("bad-verdict", spam_status=spam_status, virus_status=virus_status),
                 None,
             )
 
         assert result["statusCode"] == 200
-        assert "spamVerdict" in result["body"]
+        assert expected in result["body"]
+        s3 = boto3.client("s3", region_name="us-east-1")
+        assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
 
     @mock_aws
-    def test_virus_rejection(self):
-        _setup_dynamodb("passpl")
-        _setup_s3("passpl", "virus-msg", VALID_EMAIL_BYTES)
-
+    def test_verdict_checked_before_tenant_lookup(self):
+        """Spam is rejected without touching DynamoDB, and a failed delete is not fatal."""
         with patch.dict(os.environ, _env_vars(), clear=False):
             result = lambda_handler(
-                _ses_event("virus-msg", virus_status="FAIL"),
+                _ses_event("spam-msg", spam_status="FAIL"),
                 None,
             )
 
         assert result["statusCode"] == 200
-        assert "virusVerdict" in result["body"]
+        assert "spamVerdict" in result["body"]
 
+    def test_delete_connection_error_not_fatal(self):
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch("ses_invoice_processor.handler._s3_client") as s3_client,
+        ):
+            s3_client.return_value.delete_object.side_effect = EndpointConnectionError(endpoint_url="https://s3")
+            result = lambda_handler(_ses_event("spam-msg", spam_status="FAIL"), None)
+
+        assert result["body"] == "Rejected: spamVerdict FAIL"
+
+    @pytest.mark.parametrize(
+        "email_bytes, expected",
+        [(BAD_SUBJECT_EMAIL_BYTES, "subject mismatch"), (NO_ATTACHMENTS_EMAIL_BYTES, "no attachments")],
+        ids=["bad_subject", "no_attachments"],
+    )
     @mock_aws
-    def test_bad_subject_ignored(self):
+    def test_email_ignored(self, email_bytes, expected):
         _setup_dynamodb("passpl")
-        _setup_s3("passpl", "bad-subj", BAD_SUBJECT_EMAIL_BYTES)
+        _setup_s3("passpl", "ignored-msg", email_bytes)
 
         with patch.dict(os.environ, _env_vars(), clear=False):
-            result = lambda_handler(_ses_event("bad-subj"), None)
+            result = lambda_handler(_ses_event("ignored-msg"), None)
 
         assert result["statusCode"] == 200
-        assert "subject mismatch" in result["body"]
+        assert expected in result["body"]
 
+    @pytest.mark.parametrize("prefix", ["custom-inbound", "custom-inbound/"])
     @mock_aws
-    def test_no_attachments_ignored(self):
+    @responses.activate
+    def test_s3_prefix_used(self, prefix):
         _setup_dynamodb("passpl")
-        _setup_s3("passpl", "no-attach", NO_ATTACHMENTS_EMAIL_BYTES)
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        s3.put_object(Bucket=BUCKET, Key="custom-inbound/passpl/prefixed", Body=VALID_EMAIL_BYTES)
+        _mock_api_calls()
 
-        with patch.dict(os.environ, _env_vars(), clear=False):
-            result = lambda_handler(_ses_event("no-attach"), None)
+        with patch.dict(os.environ, {**_env_vars(), "SES_EMAIL_PREFIX": prefix}, clear=False):
+            result = lambda_handler(_ses_event("prefixed"), None)
+
+        assert "files_uploaded=1" in result["body"]
+
+    @mock_aws
+    def test_oversized_email_rejected(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "big-msg", VALID_EMAIL_BYTES + b"x" * (1024 * 1024))
+
+        with patch.dict(os.environ, {**_env_vars(), "MAX_EMAIL_SIZE_MB": "1"}, clear=False):
+            result = lambda_handler(_ses_event("big-msg"), None)
+
+        assert result["statusCode"] == 200
+        assert "too large" in result["body"]
+
+    @pytest.mark.parametrize("value", ["lots", "\u00b2", "0", "-5", "1.5"])
+    def test_invalid_max_email_size_returns_200(self, value):
+        with patch.dict(os.environ, {**_env_vars(), "MAX_EMAIL_SIZE_MB": value}, clear=False):
+            result = lambda_handler(_ses_event(), None)
 
         assert result["statusCode"] == 200
-        assert "no attachments" in result["body"]
+        assert "MAX_EMAIL_SIZE_MB" in result["body"]
 
     def test_missing_config_returns_200(self):
         """Even config errors return 200 to avoid SES retries."""
@@ -294,6 +352,19 @@ class TestLambdaHandler:
         assert result["statusCode"] == 200
         assert "no matching tenant" in result["body"]
 
+    def test_unknown_tenant_no_aws_calls(self):
+        """Misrouted mail is rejected from the event alone, before any S3 or DynamoDB call."""
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch("ses_invoice_processor.handler._s3_client") as s3_client,
+            patch.object(TenantConfigStore, "_get_dynamodb", autospec=True) as get_dynamodb,
+        ):
+            result = lambda_handler(_ses_event(recipients=["random@other.com"]), None)
+
+        assert "no matching tenant" in result["body"]
+        s3_client.assert_not_called()
+        get_dynamodb.assert_not_called()
+
     @mock_aws
     def test_tenant_not_in_dynamodb(self):
         """Tenant extracted from email but not configured in DynamoDB."""
@@ -410,3 +481,316 @@ class TestLambdaHandler:
         assert "files_uploaded=1" in result["body"]
         # Verify requests went to custom URL, not default
         assert all(custom_url in call.request.url for call in responses.calls)
+
+    @mock_aws
+    @responses.activate
+    def test_multiple_records_share_tenant_scan(self):
+        """Tenants for a multi-record event all come from the one preloading Scan."""
+        dynamodb = _setup_dynamodb("tenant-a")
+        dynamodb.Table(TABLE_NAME).put_item(Item={
+            "tenant_slug": "tenant-b",
+            "service_email": "svc@tenant-b.satvos.com",
+            "service_password": "pass-b",
+            "enabled": True,
+        })
+        _setup_s3("tenant-a", "msg-a", VALID_EMAIL_BYTES)
+        boto3.client("s3", region_name="us-east-1").put_object(
+            Bucket=BUCKET, Key="ses-inbound/tenant-b/msg-b", Body=VALID_EMAIL_BYTES
+        )
+        _mock_api_calls()
+
+        event = _ses_event("msg-a", recipients=["invoices@tenant-a.satvos.com"])
+        event["Records"] += _ses_event("msg-b", recipients=["invoices@tenant-b.satvos.com"])["Records"]
+        event["Records"] += _ses_event("msg-c", recipients=["random@other.com"])["Records"]
+
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch.object(TenantConfigStore, "_fetch", autospec=True) as fetch,
+        ):
+            result = lambda_handler(event, None)
+
+        lines = result["body"].split("\n")
+        assert result["statusCode"] == 200
+        assert "tenant=tenant-a" in lines[0]
+        assert "tenant=tenant-b" in lines[1]
+        assert "no matching tenant" in lines[2]
+        fetch.assert_not_called()
+
+
+class TestMultipleRecords:
+    def test_records_processed_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def process_record(ses_record, tenant_slug, tenant_config, s3, config):
+            barrier.wait()  # only returns once a second record is in flight
+            return ses_record["mail"]["messageId"]
+
+        event = _ses_event("msg-1", recipients=["random@other.com"])
+        event["Records"] += _ses_event("msg-2", recipients=["random@other.com"])["Records"]
+
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch("ses_invoice_processor.handler._process_record", side_effect=process_record),
+        ):
+            result = lambda_handler(event, None)
+
+        assert result["body"] == "msg-1\nmsg-2"
+
+    def test_failed_record_does_not_affect_others(self):
+        def process_record(ses_record, tenant_slug, tenant_config, s3, config):
+            if ses_record["mail"]["messageId"] == "boom":
+                raise RuntimeError("boom")
+            return "ok"
+
+        event = _ses_event("boom", recipients=["random@other.com"])
+        event["Records"] += _ses_event("fine", recipients=["random@other.com"])["Records"]
+
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch("ses_invoice_processor.handler._process_record", side_effect=process_record),
+        ):
+            result = lambda_handler(event, None)
+
+        assert result["body"] == "Internal error (logged)\nok"
+
+
+class TestRangedFetch:
+    def _invoke(self, message_id: str, calls: list | None = None):
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            s3 = _s3_client()
+            with patch.object(s3, "get_object", wraps=s3.get_object) as get_object:
+                result = lambda_handler(_ses_event(message_id), None)
+        if calls is not None:
+            calls.extend(get_object.call_args_list)
+        return result, [call.kwargs.get("Range") for call in get_object.call_args_list]
+
+    @staticmethod
+    def _large_email() -> bytes:
+        filler = b"--boundary123\r\nContent-Type: text/plain\r\n\r\n" + b"x" * (2 * HEADER_PEEK_BYTES) + b"\r\n"
+        return VALID_EMAIL_BYTES.replace(b"--boundary123\r\n", filler + b"--boundary123\r\n", 1)
+
+    @mock_aws
+    def test_bad_subject_avoids_full_download(self):
+        _setup_dynamodb("passpl")
+        padding = b"x" * (2 * HEADER_PEEK_BYTES) + b"\r\n"
+        _setup_s3("passpl", "bad-large", BAD_SUBJECT_EMAIL_BYTES + padding)
+
+        result, ranges = self._invoke("bad-large")
+
+        assert "subject mismatch" in result["body"]
+        assert ranges == [f"bytes=0-{HEADER_PEEK_BYTES - 1}"]
+
+    @mock_aws
+    @responses.activate
+    def test_large_email_fetched_in_two_ranges(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "large", self._large_email())
+        _mock_api_calls()
+
+        iter_chunks = StreamingBody.iter_chunks
+        with patch.object(StreamingBody, "iter_chunks", autospec=True, side_effect=iter_chunks) as spy:
+            result, ranges = self._invoke("large")
+
+        assert "files_uploaded=1" in result["body"]
+        assert ranges == [f"bytes=0-{HEADER_PEEK_BYTES - 1}", f"bytes={HEADER_PEEK_BYTES}-"]
+        assert spy.call_args.kwargs["chunk_size"] == S3_READ_CHUNK_BYTES
+
+    @mock_aws
+    @responses.activate
+    def test_second_range_pinned_to_first_etag(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "large", self._large_email())
+        _mock_api_calls()
+        etag = boto3.client("s3", region_name="us-east-1").head_object(
+            Bucket=BUCKET, Key="ses-inbound/passpl/large"
+        )["ETag"]
+
+        calls = []
+        result, _ = self._invoke("large", calls)
+
+        assert "files_uploaded=1" in result["body"]
+        assert "IfMatch" not in calls[0].kwargs
+        assert calls[1].kwargs["IfMatch"] == etag
+
+    @mock_aws
+    def test_empty_object_ignored(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "empty", b"")
+
+        result, ranges = self._invoke("empty")
+
+        assert result["body"] == "Ignored: empty email"
+        assert len(ranges) == 1
+
+    @mock_aws
+    @responses.activate
+    def test_small_email_fetched_once(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "small", VALID_EMAIL_BYTES)
+        _mock_api_calls()
+
+        result, ranges = self._invoke("small")
+
+        assert "files_uploaded=1" in result["body"]
+        assert len(ranges) == 1
+
+
+class TestClientCaching:
+    @mock_aws
+    def test_clients_reused_across_invocations(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "bad-subj", BAD_SUBJECT_EMAIL_BYTES)
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            lambda_handler(_ses_event("bad-subj"), None)
+            s3 = _s3_client()
+            store = _tenant_store(TABLE_NAME)
+            lambda_handler(_ses_event("bad-subj"), None)
+
+            assert _s3_client() is s3
+            assert _tenant_store(TABLE_NAME) is store
+
+    @mock_aws
+    @responses.activate
+    def test_token_reused_across_invocations(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "test-msg-001", VALID_EMAIL_BYTES)
+        _mock_api_calls()
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            lambda_handler(_ses_event(), None)
+            lambda_handler(_ses_event(), None)
+
+        logins = [call for call in responses.calls if call.request.url.endswith("/auth/login")]
+        assert len(logins) == 1
+
+    @mock_aws
+    def test_tenant_configs_preloaded_by_one_scan(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "bad-subj", BAD_SUBJECT_EMAIL_BYTES)
+        operations = []
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            events = _tenant_store(TABLE_NAME)._get_dynamodb().meta.client.meta.events
+            events.register("before-call.dynamodb", lambda model, **kwargs: operations.append(model.name))
+            for _ in range(10):
+                lambda_handler(_ses_event("bad-subj"), None)
+
+        assert operations == ["Scan"]
+
+    @mock_aws
+    def test_tenant_added_after_scan_is_found(self):
+        dynamodb = _setup_dynamodb("passpl")
+        _setup_s3("passpl", "bad-subj", BAD_SUBJECT_EMAIL_BYTES)
+        boto3.client("s3", region_name="us-east-1").put_object(
+            Bucket=BUCKET, Key="ses-inbound/newco/bad-subj", Body=BAD_SUBJECT_EMAIL_BYTES
+        )
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            lambda_handler(_ses_event("bad-subj"), None)
+            dynamodb.Table(TABLE_NAME).put_item(Item={
+                "tenant_slug": "newco",
+                "service_email": "svc@newco.satvos.com",
+                "service_password": "pass-new",
+                "enabled": True,
+            })
+            result = lambda_handler(_ses_event("bad-subj", recipients=["invoices@newco.satvos.com"]), None)
+
+        assert "subject mismatch" in result["body"]
+
+    @mock_aws
+    def test_unknown_tenant_looked_up_once(self):
+        _setup_dynamodb("passpl")
+        operations = []
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            events = _tenant_store(TABLE_NAME)._get_dynamodb().meta.client.meta.events
+            events.register("before-call.dynamodb", lambda model, **kwargs: operations.append(model.name))
+            for _ in range(10):
+                result = lambda_handler(_ses_event(recipients=["invoices@unknown-co.satvos.com"]), None)
+
+        assert "not configured" in result["body"]
+        assert operations == ["Scan", "BatchGetItem"]
+
+    @mock_aws
+    def test_new_tenants_fetched_in_one_batch(self):
+        dynamodb = _setup_dynamodb("passpl")
+        _setup_s3("passpl", "bad-subj", BAD_SUBJECT_EMAIL_BYTES)
+        operations = []
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            lambda_handler(_ses_event("bad-subj"), None)  # preloads passpl only
+            for slug in ("new-a", "new-b"):
+                dynamodb.Table(TABLE_NAME).put_item(Item={
+                    "tenant_slug": slug,
+                    "service_email": f"svc@{slug}.satvos.com",
+                    "service_password": "pass",
+                    "enabled": True,
+                })
+            event = _ses_event("msg-a", recipients=["invoices@new-a.satvos.com"])
+            event["Records"] += _ses_event("msg-b", recipients=["invoices@new-b.satvos.com"])["Records"]
+            event["Records"] += _ses_event("bad-subj")["Records"]
+
+            events = _tenant_store(TABLE_NAME)._get_dynamodb().meta.client.meta.events
+            events.register("before-call.dynamodb", lambda model, **kwargs: operations.append(model.name))
+            result = lambda_handler(event, None)
+
+        lines = result["body"].split("\n")
+        assert "subject mismatch" in lines[2]
+        assert "not configured" not in result["body"]
+        assert operations == ["BatchGetItem"]
+
+    @mock_aws
+    def test_multi_record_cold_start_builds_one_client_each(self):
+        _setup_dynamodb("passpl")
+        _setup_s3("passpl", "bad-subj", BAD_SUBJECT_EMAIL_BYTES)
+        event = _ses_event("bad-subj")
+        event["Records"] *= 4
+
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch("boto3.client", wraps=boto3.client) as client,
+            patch("boto3.resource", wraps=boto3.resource) as resource,
+        ):
+            result = lambda_handler(event, None)
+
+        assert result["body"].count("subject mismatch") == 4
+        assert [call.args[0] for call in client.call_args_list] == ["s3"]
+        assert [call.args[0] for call in resource.call_args_list] == ["dynamodb"]
+
+    def test_reset_clients(self):
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            store = _tenant_store(TABLE_NAME)
+            reset_clients()
+            assert _tenant_store(TABLE_NAME) is not store
+
+
+class TestLoggingConfiguration:
+    def test_configured_once_across_invocations(self):
+        with (
+            patch.dict(os.environ, _env_vars(), clear=False),
+            patch("ses_invoice_processor.handler._logging_configured", False),
+            patch.object(Config, "configure_logging") as configure,
+        ):
+            lambda_handler(_ses_event(recipients=["random@other.com"]), None)
+            lambda_handler(_ses_event(recipients=["random@other.com"]), None)
+
+        assert configure.call_count == 1
+
+
+class TestConfigCaching:
+    def test_config_loaded_once(self):
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            config = get_config()
+        with patch.dict(os.environ, {"SES_EMAIL_BUCKET": "other-bucket"}, clear=False):
+            assert get_config() is config
+            assert get_config().ses_email_bucket == BUCKET
+
+    def test_config_error_not_cached(self):
+        env = {k: v for k, v in _env_vars().items() if k != "SATVOS_API_BASE_URL"}
+        with patch.dict(os.environ, env, clear=True):
+            result = lambda_handler(_ses_event(), None)
+        assert "Configuration error" in result["body"]
+
+        with patch.dict(os.environ, _env_vars(), clear=False):
+            assert get_config().default_api_base_url == BASE_URL
@@ -1,16 +1,57 @@
 """Tests for satvos_client module."""
 
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
 
 import pytest
 import responses
+from responses import matchers
+from urllib3 import HTTPResponse
+from urllib3.filepost import encode_multipart_formdata
 
 from ses_invoice_processor.email_parser import Attachment
 from ses_invoice_processor.exceptions import AuthenticationError, SatvosAPIError
-from ses_invoice_processor.satvos_client import SatvosClient
+from ses_invoice_processor.satvos_client import (
+    MAX_PARALLEL_REQUESTS,
+    MAX_RETRY_AFTER_SECONDS,
+    SatvosClient,
+    TokenPair,
+    _group_attachments,
+    _MultipartBody,
+    _parse_expiry,
+    clear_token_cache,
+)
 
 BASE_URL = "https://api.test.satvos.com/api/v1"
+URL_LOGIN = f"{BASE_URL}/auth/login"
+URL_REFRESH = f"{BASE_URL}/auth/refresh"
+URL_COLLECTIONS = f"{BASE_URL}/collections"
+URL_DOCUMENTS = f"{BASE_URL}/documents"
+
+# Expiry for tokens that tests never expect to need refreshing
+FAR_FUTURE_EXPIRY = datetime(2099, 1, 1, tzinfo=timezone.utc).isoformat()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_token_cache():
+    clear_token_cache()
+    yield
+    clear_token_cache()
+
+
+@pytest.fixture
+def client():
+    """A client holding a valid token, for tests that don't exercise login itself."""
+    client = SatvosClient(BASE_URL)
+    client._use_token(TokenPair("access-tok", "refresh-tok", time.time() + 3600))
+    return client
+
+
+def _collection_files_url(collection_id: str) -> str:
+    return f"{URL_COLLECTIONS}/{collection_id}/files"
 
 
 def _future_expiry(minutes: int = 15) -> str:
@@ -24,13 +65,13 @@ def _past_expiry() -> str:
 def _mock_login(status: int = 200, access_token: str = "access-tok", expires_at: str | None = None):
     responses.add(
         responses.POST,
-        f"{BASE_URL}/auth/login",
+        URL_LOGIN,
         json={
             "success": True,
             "data": {
                 "access_token": access_token,
                 "refresh_token": "refresh-tok",
-                "expires_at": expires_at or _future_expiry(),
+                "expires_at": expires_at or FAR_FUTURE_EXPIRY,
             },
         },
         status=status,
@@ -40,19 +81,35 @@ def _mock_login(status: int = 200, access_token: str = "access-tok", expires_at:
 def _mock_refresh(status: int = 200, access_token: str = "new-access-tok"):
     responses.add(
         responses.POST,
-        f"{BASE_URL}/auth/refresh",
+        URL_REFRESH,
         json={
             "success": True,
             "data": {
                 "access_token": access_token,
                 "refresh_token": "new-refresh-tok",
-                "expires_at": _future_expiry(),
+                "expires_at": FAR_FUTURE_EXPIRY,
             },
         },
         status=status,
     )
 
 
+def _mock_documents(failing_file_ids: frozenset[str] = frozenset()):
+    """Stub POST /documents with a single callback.
+
+    Documents are created concurrently, so the response is chosen by the
+    request's file_id rather than by call order.
+    """
+
+    def callback(request):
+        file_id = json.loads(request.body)["file_id"]
+        if file_id in failing_file_ids:
+            return 500, {}, json.dumps({"success": False, "error": "parse error"})
+        return 201, {}, json.dumps({"success": True, "data": {"id": f"doc-{file_id}", "parsing_status": "pending"}})
+
+    responses.add_callback(responses.POST, URL_DOCUMENTS, callback=callback, content_type="application/json")
+
+
 def _make_attachment(filename: str = "test.pdf", content_type: str = "application/pdf", data: bytes = b"%PDF") -> Attachment:
     return Attachment(filename=filename, content_type=content_type, data=data, extension="pdf")
 
@@ -70,7 +127,7 @@ class TestAuthenticate:
     def test_login_failure(self):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/auth/login",
+            URL_LOGIN,
             json={"success": False, "error": "invalid credentials"},
             status=401,
         )
@@ -79,6 +136,72 @@ class TestAuthenticate:
             client.authenticate("bad@test.com", "wrong")
         assert exc_info.value.status_code == 401
 
+    @responses.activate
+    def test_token_reused_by_later_client(self):
+        _mock_login()
+        SatvosClient(BASE_URL).authenticate("user@test.com", "password123")
+
+        client = SatvosClient(BASE_URL)
+        client.authenticate("user@test.com", "password123")
+
+        assert responses.assert_call_count(URL_LOGIN, 1)
+        assert client._session.headers["Authorization"] == "Bearer access-tok"
+
+    @responses.activate
+    def test_token_not_shared_between_users(self):
+        _mock_login()
+        SatvosClient(BASE_URL).authenticate("user@test.com", "password123")
+        SatvosClient(BASE_URL).authenticate("other@test.com", "password123")
+        SatvosClient(BASE_URL, "other-tenant").authenticate("user@test.com", "password123")
+
+        assert responses.assert_call_count(URL_LOGIN, 3)
+
+    @responses.activate
+    def test_expiring_token_not_reused(self):
+        _mock_login(expires_at=_future_expiry(minutes=0))
+        SatvosClient(BASE_URL).authenticate("user@test.com", "password123")
+        SatvosClient(BASE_URL).authenticate("user@test.com", "password123")
+
+        assert responses.assert_call_count(URL_LOGIN, 2)
+
+    @responses.activate
+    def test_token_not_reused_after_password_change(self):
+        _mock_login()
+        SatvosClient(BASE_URL).authenticate("user@test.com", "old-password")
+        SatvosClient(BASE_URL).authenticate("user@test.com", "new-password")
+
+        assert responses.assert_call_count(URL_LOGIN, 2)
+
+    @responses.activate
+    def test_rejected_cached_token_replaced(self):
+        _mock_login(access_token="revoked-tok")
+        _mock_login(access_token="fresh-tok")
+        responses.add(responses.POST, URL_COLLECTIONS, json={"success": False, "error": "unauthorized"}, status=401)
+        responses.add(responses.POST, URL_COLLECTIONS, json={"success": True, "data": {"id": "coll-1"}}, status=201)
+        SatvosClient(BASE_URL).authenticate("user@test.com", "password123")
+
+        client = SatvosClient(BASE_URL)
+        client.authenticate("user@test.com", "password123")
+        assert client.create_collection("Test", "desc") == "coll-1"
+
+        assert responses.assert_call_count(URL_LOGIN, 2)
+        assert responses.calls[-1].request.headers["Authorization"] == "Bearer fresh-tok"
+        SatvosClient(BASE_URL).authenticate("user@test.com", "password123")
+        assert responses.assert_call_count(URL_LOGIN, 2)  # fresh token cached in place of the revoked one
+
+    @responses.activate
+    def test_rejected_token_relogin_only_once(self):
+        _mock_login()
+        responses.add(responses.POST, URL_COLLECTIONS, json={"success": False, "error": "forbidden"}, status=401)
+
+        client = SatvosClient(BASE_URL)
+        client.authenticate("user@test.com", "password123")
+        with pytest.raises(SatvosAPIError, match="401"):
+            client.create_collection("Test", "desc")
+
+        assert responses.assert_call_count(URL_LOGIN, 2)
+        assert responses.assert_call_count(URL_COLLECTIONS, 2)
+
 
 class TestTokenRefresh:
     @responses.activate
@@ -87,7 +210,7 @@ class TestTokenRefresh:
         _mock_refresh()
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-123"}},
             status=201,
         )
@@ -97,16 +220,16 @@ class TestTokenRefresh:
         # Token is already expired, so create_collection should trigger refresh
         client.create_collection("Test", "desc")
 
-        # Verify refresh was called
-        assert len(responses.calls) == 3  # login + refresh + create_collection
-        assert "/auth/refresh" in responses.calls[1].request.url
+        assert responses.assert_call_count(URL_LOGIN, 1)
+        assert responses.assert_call_count(URL_REFRESH, 1)
+        assert responses.assert_call_count(URL_COLLECTIONS, 1)
 
     @responses.activate
     def test_no_refresh_when_token_valid(self):
         _mock_login()
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-123"}},
             status=201,
         )
@@ -115,15 +238,29 @@ class TestTokenRefresh:
         client.authenticate("user@test.com", "password123")
         client.create_collection("Test", "desc")
 
-        # Only login + create_collection, no refresh
-        assert len(responses.calls) == 2
+        assert responses.assert_call_count(URL_LOGIN, 1)
+        assert responses.assert_call_count(URL_REFRESH, 0)
+        assert responses.assert_call_count(URL_COLLECTIONS, 1)
+
+    @responses.activate
+    def test_concurrent_callers_refresh_once(self):
+        _mock_login(expires_at=_past_expiry())
+        _mock_refresh()
+
+        client = SatvosClient(BASE_URL)
+        client.authenticate("user@test.com", "password123")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: client._ensure_auth(), range(8)))
+
+        assert responses.assert_call_count(URL_REFRESH, 1)
+        assert client._session.headers["Authorization"] == "Bearer new-access-tok"
 
     @responses.activate
     def test_refresh_failure_raises(self):
         _mock_login(expires_at=_past_expiry())
         responses.add(
             responses.POST,
-            f"{BASE_URL}/auth/refresh",
+            URL_REFRESH,
             json={"success": False, "error": "refresh token expired"},
             status=401,
         )
@@ -134,34 +271,63 @@ class TestTokenRefresh:
             client.create_collection("Test", "desc")
 
 
+class TestParseExpiry:
+    def test_offset_and_naive_are_equivalent(self):
+        assert _parse_expiry("2030-01-01T00:00:00+00:00") == _parse_expiry("2030-01-01T00:00:00")
+
+    def test_offset_applied(self):
+        assert _parse_expiry("2030-01-01T05:30:00+05:30") == _parse_expiry("2030-01-01T00:00:00Z")
+
+
+class TestSession:
+    def test_pooled_adapter_mounted(self):
+        client = SatvosClient(BASE_URL)
+        adapter = client._session.get_adapter(BASE_URL)
+        assert adapter._pool_maxsize >= MAX_PARALLEL_REQUESTS
+        assert adapter.max_retries.total == 3
+
+    @responses.activate
+    def test_retries_service_unavailable(self, client):
+        responses.add(responses.POST, URL_COLLECTIONS, json={"success": False}, status=503)
+        responses.add(
+            responses.POST,
+            URL_COLLECTIONS,
+            json={"success": True, "data": {"id": "coll-r"}},
+            status=201,
+        )
+
+        assert client.create_collection("Test", "desc") == "coll-r"
+
+    @pytest.mark.parametrize("header, expected", [("3600", MAX_RETRY_AFTER_SECONDS), ("2", 2)])
+    def test_retry_after_capped(self, header, expected):
+        retry = SatvosClient(BASE_URL)._session.get_adapter(BASE_URL).max_retries
+
+        assert retry.respect_retry_after_header
+        assert retry.get_retry_after(HTTPResponse(status=429, headers={"Retry-After": header})) == expected
+
+
 class TestCreateCollection:
     @responses.activate
-    def test_success(self):
-        _mock_login()
+    def test_success(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-abc"}},
             status=201,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         coll_id = client.create_collection("Test Collection", "A test")
         assert coll_id == "coll-abc"
 
     @responses.activate
-    def test_failure(self):
-        _mock_login()
+    def test_failure(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": False, "error": "server error"},
             status=500,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         with pytest.raises(SatvosAPIError) as exc_info:
             client.create_collection("Test", "desc")
         assert exc_info.value.status_code == 500
@@ -169,11 +335,10 @@ class TestCreateCollection:
 
 class TestBatchUploadFiles:
     @responses.activate
-    def test_all_success(self):
-        _mock_login()
+    def test_all_success(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-1/files",
+            _collection_files_url("coll-1"),
             json={
                 "success": True,
                 "data": [
@@ -183,18 +348,15 @@ class TestBatchUploadFiles:
             status=201,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         results = client.batch_upload_files("coll-1", [_make_attachment()])
         assert len(results) == 1
         assert results[0]["success"] is True
 
     @responses.activate
-    def test_partial_success(self):
-        _mock_login()
+    def test_partial_success(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-1/files",
+            _collection_files_url("coll-1"),
             json={
                 "success": True,
                 "data": [
@@ -205,68 +367,175 @@ class TestBatchUploadFiles:
             status=207,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         results = client.batch_upload_files("coll-1", [_make_attachment("a.pdf"), _make_attachment("b.pdf")])
         assert len(results) == 2
         assert results[0]["success"] is True
         assert results[1]["success"] is False
 
     @responses.activate
-    def test_total_failure(self):
-        _mock_login()
+    def test_total_failure(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-1/files",
+            _collection_files_url("coll-1"),
             json={"success": False, "error": "server error"},
             status=500,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         with pytest.raises(SatvosAPIError):
             client.batch_upload_files("coll-1", [_make_attachment()])
 
+    @responses.activate
+    def test_multipart_content_type_overrides_session(self, client):
+        responses.add(
+            responses.POST,
+            _collection_files_url("coll-1"),
+            json={"success": True, "data": []},
+            status=201,
+        )
+
+        client._session.headers["Content-Type"] = "application/json"
+        client.batch_upload_files("coll-1", [_make_attachment()])
+
+        sent = responses.calls[-1].request.headers
+        assert sent["Content-Type"].startswith("multipart/form-data; boundary=")
+        assert sent["Authorization"] == "Bearer access-tok"
 
-class TestCreateDocument:
     @responses.activate
-    def test_success(self):
+    def test_upload_resent_in_full_after_relogin(self):
         _mock_login()
+        responses.add(responses.POST, _collection_files_url("coll-1"), json={"success": False}, status=401)
+        responses.add(responses.POST, _collection_files_url("coll-1"), json={"success": True, "data": []}, status=201)
+
+        client = SatvosClient(BASE_URL)
+        client.authenticate("user@test.com", "password123")
+        client.batch_upload_files("coll-1", [_make_attachment(data=b"%PDF-body")])
+
+        first, retry = (c.request for c in responses.calls if c.request.url == _collection_files_url("coll-1"))
+        assert b"%PDF-body" in retry.body
+        assert retry.body == first.body
+
+
+class TestGroupedUpload:
+    def test_group_attachments(self):
+        atts = [_make_attachment(f"{i}.pdf", data=b"x" * size) for i, size in enumerate([4, 4, 3, 10, 1])]
+        groups = _group_attachments(atts, 8)
+        assert [[a.filename for a in g] for g in groups] == [["0.pdf", "1.pdf"], ["2.pdf"], ["3.pdf"], ["4.pdf"]]
+
+    @responses.activate
+    def test_large_batch_split_into_groups(self, client):
+        for i in range(3):
+            responses.add(
+                responses.POST,
+                _collection_files_url("coll-1"),
+                json={
+                    "success": True,
+                    "data": [{"success": True, "file": {"id": f"f{i}", "original_name": f"{i}.pdf"}, "error": None}],
+                },
+                status=201,
+            )
+
+        atts = [_make_attachment(f"{i}.pdf", data=b"x" * 10) for i in range(3)]
+        with patch("ses_invoice_processor.satvos_client.UPLOAD_GROUP_BYTES", 10):
+            results = client.batch_upload_files("coll-1", atts)
+
+        assert len(results) == 3
+        assert all(r["success"] for r in results)
+        assert len([c for c in responses.calls if c.request.url.endswith("/files")]) == 3
+
+    @responses.activate
+    def test_failed_group_reported_per_file(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/documents",
+            _collection_files_url("coll-1"),
+            json={"success": True, "data": [{"success": True, "file": {"id": "f0", "original_name": "0.pdf"}, "error": None}]},
+            status=201,
+        )
+        responses.add(
+            responses.POST,
+            _collection_files_url("coll-1"),
+            json={"success": False, "error": "server error"},
+            status=500,
+        )
+
+        atts = [_make_attachment(f"{i}.pdf", data=b"x" * 10) for i in range(2)]
+        with (
+            patch("ses_invoice_processor.satvos_client.UPLOAD_GROUP_BYTES", 10),
+            patch("ses_invoice_processor.satvos_client.MAX_PARALLEL_UPLOADS", 1),
+        ):
+            results = client.batch_upload_files("coll-1", atts)
+
+        assert [r["success"] for r in results] == [True, False]
+        assert results[1]["file"]["original_name"] == "1.pdf"
+
+
+class TestMultipartBody:
+    def _attachments(self):
+        return [
+            _make_attachment("a.pdf", data=b"%PDF" * 1000),
+            _make_attachment("scan.png", content_type="image/png", data=b"\x89PNG"),
+        ]
+
+    def test_matches_urllib3_encoding(self):
+        atts = self._attachments()
+        body = _MultipartBody("files", atts, boundary="testboundary")
+        expected, content_type = encode_multipart_formdata(
+            [("files", (a.filename, a.data, a.content_type)) for a in atts],
+            boundary="testboundary",
+        )
+        assert body.content_type == content_type
+        assert len(body) == len(expected)
+        assert body.read() == expected
+
+    def test_chunked_reads_and_rewind(self):
+        body = _MultipartBody("files", self._attachments())
+        chunks = []
+        while chunk := body.read(333):
+            chunks.append(chunk)
+        full = b"".join(chunks)
+        assert len(full) == len(body)
+        assert body.tell() == len(body)
+
+        body.seek(0)
+        assert body.read() == full
+
+
+class TestCreateDocument:
+    @responses.activate
+    def test_success(self, client):
+        # Only matches if the request body is exactly this JSON
+        responses.add(
+            responses.POST,
+            URL_DOCUMENTS,
+            match=[
+                matchers.json_params_matcher({
+                    "file_id": "file-1",
+                    "collection_id": "coll-1",
+                    "document_type": "invoice",
+                    "parse_mode": "single",
+                })
+            ],
             json={"success": True, "data": {"id": "doc-xyz", "parsing_status": "pending"}},
             status=201,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         doc_id = client.create_document("file-1", "coll-1")
         assert doc_id == "doc-xyz"
 
-        # Verify request body
-        body = json.loads(responses.calls[1].request.body)
-        assert body["file_id"] == "file-1"
-        assert body["collection_id"] == "coll-1"
-        assert body["document_type"] == "invoice"
-        assert body["parse_mode"] == "single"
-
 
 class TestProcessAttachments:
     @responses.activate
-    def test_full_pipeline(self):
-        _mock_login()
+    def test_full_pipeline(self, client):
         # Create collection
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-new"}},
             status=201,
         )
         # Batch upload
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-new/files",
+            _collection_files_url("coll-new"),
             json={
                 "success": True,
                 "data": [
@@ -277,21 +546,8 @@ class TestProcessAttachments:
             status=201,
         )
         # Create documents (one per file)
-        responses.add(
-            responses.POST,
-            f"{BASE_URL}/documents",
-            json={"success": True, "data": {"id": "d1", "parsing_status": "pending"}},
-            status=201,
-        )
-        responses.add(
-            responses.POST,
-            f"{BASE_URL}/documents",
-            json={"success": True, "data": {"id": "d2", "parsing_status": "pending"}},
-            status=201,
-        )
+        _mock_documents()
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         result = client.process_attachments(
             "Acme Corp",
             [_make_attachment("inv1.pdf"), _make_attachment("inv2.pdf")],
@@ -306,17 +562,16 @@ class TestProcessAttachments:
         assert result.documents_failed == []
 
     @responses.activate
-    def test_sender_email_in_collection_description(self):
-        _mock_login()
+    def test_sender_email_in_collection_description(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-s"}},
             status=201,
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-s/files",
+            _collection_files_url("coll-s"),
             json={
                 "success": True,
                 "data": [
@@ -327,32 +582,29 @@ class TestProcessAttachments:
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/documents",
+            URL_DOCUMENTS,
             json={"success": True, "data": {"id": "d1"}},
             status=201,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         client.process_attachments("Test Co", [_make_attachment()], sender_email="sender@test.com")
 
         # Verify collection description includes sender
-        create_coll_call = responses.calls[1]  # login=0, create_collection=1
+        create_coll_call = responses.calls[0]
         body = json.loads(create_coll_call.request.body)
         assert "sender@test.com" in body["description"]
 
     @responses.activate
-    def test_no_sender_email_fallback(self):
-        _mock_login()
+    def test_no_sender_email_fallback(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-f"}},
             status=201,
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-f/files",
+            _collection_files_url("coll-f"),
             json={
                 "success": True,
                 "data": [
@@ -363,32 +615,29 @@ class TestProcessAttachments:
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/documents",
+            URL_DOCUMENTS,
             json={"success": True, "data": {"id": "d1"}},
             status=201,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         client.process_attachments("Test Co", [_make_attachment()])
 
         # Verify fallback description (no sender_email)
-        create_coll_call = responses.calls[1]
+        create_coll_call = responses.calls[0]
         body = json.loads(create_coll_call.request.body)
         assert "Auto-imported from email for Test Co" in body["description"]
 
     @responses.activate
-    def test_partial_upload_failure(self):
-        _mock_login()
+    def test_partial_upload_failure(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-p"}},
             status=201,
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-p/files",
+            _collection_files_url("coll-p"),
             json={
                 "success": True,
                 "data": [
@@ -400,13 +649,11 @@ class TestProcessAttachments:
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/documents",
+            URL_DOCUMENTS,
             json={"success": True, "data": {"id": "d1"}},
             status=201,
         )
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         result = client.process_attachments(
             "Test Co",
             [_make_attachment("ok.pdf"), _make_attachment("bad.pdf")],
@@ -418,17 +665,16 @@ class TestProcessAttachments:
         assert result.documents_created == 1
 
     @responses.activate
-    def test_document_creation_failure_continues(self):
-        _mock_login()
+    def test_document_creation_failure_continues(self, client):
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections",
+            URL_COLLECTIONS,
             json={"success": True, "data": {"id": "coll-d"}},
             status=201,
         )
         responses.add(
             responses.POST,
-            f"{BASE_URL}/collections/coll-d/files",
+            _collection_files_url("coll-d"),
             json={
                 "success": True,
                 "data": [
@@ -438,23 +684,9 @@ class TestProcessAttachments:
             },
             status=201,
         )
-        # First document fails
-        responses.add(
-            responses.POST,
-            f"{BASE_URL}/documents",
-            json={"success": False, "error": "parse error"},
-            status=500,
-        )
-        # Second document succeeds
-        responses.add(
-            responses.POST,
-            f"{BASE_URL}/documents",
-            json={"success": True, "data": {"id": "d2"}},
-            status=201,
-        )
+        # Document for f1 fails, f2 succeeds
+        _mock_documents(failing_file_ids={"f1"})
 
-        client = SatvosClient(BASE_URL)
-        client.authenticate("user@test.com", "password123")
         result = client.process_attachments(
             "Fail Co",
             [_make_attachment("a.pdf"), _make_attachment("b.pdf")],
@@ -464,6 +696,41 @@ class TestProcessAttachments:
         assert result.files_uploaded == 2
         assert result.documents_created == 1
         assert len(result.documents_failed) == 1
+        assert result.documents_failed[0].startswith("a.pdf:")
+
+    @responses.activate
+    def test_many_documents_created_concurrently(self, client):
+        responses.add(
+            responses.POST,
+            URL_COLLECTIONS,
+            json={"success": True, "data": {"id": "coll-m"}},
+            status=201,
+        )
+        responses.add(
+            responses.POST,
+            _collection_files_url("coll-m"),
+            json={
+                "success": True,
+                "data": [
+                    {"success": True, "file": {"id": f"f{i}", "original_name": f"inv{i}.pdf"}, "error": None}
+                    for i in range(12)
+                ],
+            },
+            status=201,
+        )
+        responses.add(
+            responses.POST,
+            URL_DOCUMENTS,
+            json={"success": True, "data": {"id": "d"}},
+            status=201,
+        )
+
+        result = client.process_attachments("Many Co", [_make_attachment(f"inv{i}.pdf") for i in range(12)])
+
+        assert result.files_uploaded == 12
+        assert result.documents_created == 12
+        file_ids = {json.loads(c.request.body)["file_id"] for c in responses.calls if c.request.url.endswith("/documents")}
+        assert file_ids == {f"f{i}" for i in range(12)}
 
     def test_not_authenticated_raises(self):
         client = SatvosClient(BASE_URL)
@@ -1,5 +1,6 @@
 """Tests for tenant_config module."""
 
+import os
 import time
 from unittest.mock import patch
 
@@ -9,9 +10,13 @@ from moto import mock_aws
 
 from ses_invoice_processor.exceptions import TenantDisabledError
 from ses_invoice_processor.tenant_config import (
+    BATCH_GET_MAX_KEYS,
     CACHE_TTL_SECONDS,
+    NEGATIVE_CACHE_TTL_SECONDS,
     TenantConfig,
     TenantConfigStore,
+    _cache_lock,
+    _extract_tenant_slug,
     extract_tenant_slug,
 )
 
@@ -28,8 +33,8 @@ def _create_table(dynamodb):
     )
 
 
-def _put_tenant(dynamodb, tenant_slug="passpl", enabled=True, api_base_url=None):
-    """Insert a tenant config item."""
+def _tenant_item(tenant_slug="passpl", enabled=True, api_base_url=None) -> dict:
+    """Build a tenant config item."""
     item = {
         "tenant_slug": tenant_slug,
         "service_email": f"svc@{tenant_slug}.satvos.com",
@@ -40,41 +45,64 @@ def _put_tenant(dynamodb, tenant_slug="passpl", enabled=True, api_base_url=None)
     }
     if api_base_url:
         item["api_base_url"] = api_base_url
-    dynamodb.Table(TABLE_NAME).put_item(Item=item)
+    return item
 
 
-class TestExtractTenantSlug:
-    def test_valid_recipient(self):
-        assert extract_tenant_slug(["invoices@passpl.satvos.com"]) == "passpl"
+def _put_tenant(dynamodb, tenant_slug="passpl", enabled=True, api_base_url=None):
+    """Insert a tenant config item."""
+    dynamodb.Table(TABLE_NAME).put_item(Item=_tenant_item(tenant_slug, enabled, api_base_url))
 
-    def test_valid_with_hyphens(self):
-        assert extract_tenant_slug(["invoices@my-tenant.satvos.com"]) == "my-tenant"
 
-    def test_case_insensitive(self):
-        assert extract_tenant_slug(["INVOICES@PassPL.satvos.com"]) == "passpl"
+@pytest.fixture(scope="module")
+def _mocked_aws():
+    """One moto backend for the module; tests get a fresh table from the dynamodb fixture."""
+    with mock_aws():
+        yield
 
-    def test_multiple_recipients_first_match(self):
-        result = extract_tenant_slug([
-            "admin@other.com",
-            "invoices@tenant1.satvos.com",
-            "invoices@tenant2.satvos.com",
-        ])
-        assert result == "tenant1"
 
-    def test_no_match(self):
-        assert extract_tenant_slug(["user@other.com"]) is None
+@pytest.fixture
+def dynamodb(_mocked_aws):
+    resource = boto3.resource("dynamodb", region_name="us-east-1")
+    _create_table(resource)
+    TenantConfigStore.clear_cache()
+    yield resource
+    resource.Table(TABLE_NAME).delete()
 
-    def test_wrong_prefix(self):
-        assert extract_tenant_slug(["billing@passpl.satvos.com"]) is None
 
-    def test_wrong_domain(self):
-        assert extract_tenant_slug(["invoices@passpl.otherdomain.com"]) is None
+@pytest.fixture
+def store(dynamodb):
+    return TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
 
-    def test_empty_list(self):
-        assert extract_tenant_slug([]) is None
 
-    def test_whitespace_trimmed(self):
-        assert extract_tenant_slug(["  invoices@passpl.satvos.com  "]) == "passpl"
+class TestExtractTenantSlug:
+    @pytest.mark.parametrize(
+        "recipients, expected",
+        [
+            (["invoices@passpl.satvos.com"], "passpl"),
+            (["invoices@my-tenant.satvos.com"], "my-tenant"),
+            (["INVOICES@PassPL.satvos.com"], "passpl"),
+            (["admin@other.com", "invoices@tenant1.satvos.com", "invoices@tenant2.satvos.com"], "tenant1"),
+            (["user@other.com"], None),
+            (["billing@passpl.satvos.com"], None),
+            (["invoices@passpl.otherdomain.com"], None),
+            ([], None),
+            (["  invoices@passpl.satvos.com  "], "passpl"),
+            (["invoices@a.b.satvos.com"], None),
+            (["invoices@my_tenant.satvos.com"], None),
+            (["invoices@a.b.satvos.com.evil.com"], None),
+            (["invoices@passpl.satvos.com.evil.com"], None),
+            (["invoices@.satvos.com", "invoices@satvos.com"], None),
+        ],
+    )
+    def test_extract_tenant_slug(self, recipients, expected):
+        assert extract_tenant_slug(recipients) == expected
+
+    def test_repeated_recipients_memoized(self):
+        recipients = ["invoices@memo.satvos.com"]
+        extract_tenant_slug(recipients)
+        hits = _extract_tenant_slug.cache_info().hits
+        assert extract_tenant_slug(list(recipients)) == "memo"
+        assert _extract_tenant_slug.cache_info().hits == hits + 1
 
 
 class TestTenantConfigFromDynamoDBItem:
@@ -115,66 +143,126 @@ class TestTenantConfigFromDynamoDBItem:
 
 
 class TestTenantConfigStore:
-    @mock_aws
-    def test_found(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
+    def test_found(self, dynamodb, store):
         _put_tenant(dynamodb, "passpl")
 
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
-        store.clear_cache()
         config = store.get("passpl")
 
         assert config is not None
         assert config.tenant_slug == "passpl"
         assert config.service_email == "svc@passpl.satvos.com"
 
-    @mock_aws
-    def test_not_found(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
-
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
-        store.clear_cache()
+    def test_not_found(self, store):
         config = store.get("nonexistent")
 
         assert config is None
 
-    @mock_aws
-    def test_disabled_raises(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
+    def test_disabled_raises(self, dynamodb, store):
         _put_tenant(dynamodb, "disabled-co", enabled=False)
 
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
-        store.clear_cache()
-
         with pytest.raises(TenantDisabledError, match="disabled-co"):
             store.get("disabled-co")
 
-    @mock_aws
-    def test_custom_api_base_url(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
+    def test_custom_api_base_url(self, dynamodb, store):
         _put_tenant(dynamodb, "custom", api_base_url="https://custom.api/v1")
 
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
-        store.clear_cache()
         config = store.get("custom")
 
         assert config.api_base_url == "https://custom.api/v1"
 
+    def test_default_resource_shared_between_stores(self, dynamodb):
+        TenantConfigStore.clear_cache()
+        first = TenantConfigStore(TABLE_NAME)
+        second = TenantConfigStore("other-table")
+
+        with patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1"}):
+            assert first._get_dynamodb() is second._get_dynamodb()
+
+
+class TestGetMany:
+    def test_mixed_results(self, dynamodb, store):
+        _put_tenant(dynamodb, "a")
+        _put_tenant(dynamodb, "off", enabled=False)
+
+        results = store.get_many(["a", "off", "missing", "a"])
+
+        assert set(results) == {"a", "off", "missing"}
+        assert results["a"].tenant_slug == "a"
+        assert results["off"].enabled is False
+        assert results["missing"] is None
+
+    def test_populates_cache(self, dynamodb, store):
+        _put_tenant(dynamodb, "a")
+
+        store.get_many(["a", "missing"])
+
+        dynamodb.Table(TABLE_NAME).delete_item(Key={"tenant_slug": "a"})
+        _put_tenant(dynamodb, "missing")
+        assert store.get("a") is not None
+        assert store.get("missing") is None
+
+    def test_more_than_one_batch(self, dynamodb, store):
+        slugs = [f"t{i}" for i in range(BATCH_GET_MAX_KEYS + 5)]
+        with dynamodb.Table(TABLE_NAME).batch_writer() as batch:
+            for slug in slugs:
+                batch.put_item(Item=_tenant_item(slug))
+
+        results = store.get_many(slugs)
+
+        assert all(results[slug] is not None for slug in slugs)
+
+
+class TestPreload:
+    def test_preloads_configs(self, dynamodb, store):
+        _put_tenant(dynamodb, "preloaded")
+        _put_tenant(dynamodb, "off", enabled=False)
+
+        store.preload()
+
+        with patch.object(TenantConfigStore, "_fetch", autospec=True) as fetch:
+            assert store.get("preloaded").tenant_slug == "preloaded"
+            with pytest.raises(TenantDisabledError):
+                store.get("off")
+        fetch.assert_not_called()
+
+    def test_scans_once_per_ttl(self, dynamodb):
+        _put_tenant(dynamodb, "first")
+        clock = [time.monotonic()]
+        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb, now_fn=lambda: clock[0])
+
+        scans = []
+        dynamodb.meta.client.meta.events.register("before-call.dynamodb.Scan", lambda **kwargs: scans.append(1))
+
+        store.preload()
+        store.preload()
+        assert len(scans) == 1
+
+        clock[0] += CACHE_TTL_SECONDS + 1
+        store.preload()
+        assert len(scans) == 2
+
+    def test_tenant_added_after_preload_still_found(self, dynamodb, store):
+        _put_tenant(dynamodb, "first")
+        store.preload()
+        _put_tenant(dynamodb, "second")
+
+        assert store.get("second") is not None
+
+    def test_malformed_item_skipped(self, dynamodb, store):
+        _put_tenant(dynamodb, "good")
+        dynamodb.Table(TABLE_NAME).put_item(Item={"tenant_slug": "broken"})
+
+        store.preload()
+
+        with patch.object(TenantConfigStore, "_fetch", autospec=True) as fetch:
+            assert store.get("good") is not None
+        fetch.assert_not_called()
+
 
 class TestTenantConfigStoreCache:
-    @mock_aws
-    def test_cache_hit(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
+    def test_cache_hit(self, dynamodb, store):
         _put_tenant(dynamodb, "cached")
 
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
-        store.clear_cache()
-
         # First call — cache miss
         config1 = store.get("cached")
         # Delete from DynamoDB — cache should still return it
@@ -183,36 +271,69 @@ class TestTenantConfigStoreCache:
 
         assert config1 == config2
 
-    @mock_aws
-    def test_cache_expiry(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
+    def test_cache_expiry(self, dynamodb):
         _put_tenant(dynamodb, "expiry")
 
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
+        clock = [time.monotonic()]
+        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb, now_fn=lambda: clock[0])
         store.clear_cache()
 
         # First call
         store.get("expiry")
 
-        # Expire cache by patching time.monotonic
-        with patch("ses_invoice_processor.tenant_config.time") as mock_time:
-            mock_time.monotonic.return_value = time.monotonic() + CACHE_TTL_SECONDS + 1
-            # Delete from DynamoDB so we can detect cache miss
-            dynamodb.Table(TABLE_NAME).delete_item(Key={"tenant_slug": "expiry"})
-            result = store.get("expiry")
+        # Expire cache by advancing the store's clock
+        clock[0] += CACHE_TTL_SECONDS + 1
+        # Delete from DynamoDB so we can detect cache miss
+        dynamodb.Table(TABLE_NAME).delete_item(Key={"tenant_slug": "expiry"})
+        result = store.get("expiry")
 
         assert result is None  # cache expired, DynamoDB miss
 
-    @mock_aws
-    def test_disabled_tenant_cached_raises_on_second_call(self):
-        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        _create_table(dynamodb)
-        _put_tenant(dynamodb, "off", enabled=False)
-
-        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb)
+    def test_oldest_entry_evicted_when_full(self, dynamodb, store):
+        for slug in ("one", "two", "three"):
+            _put_tenant(dynamodb, slug)
+
+        with patch("ses_invoice_processor.tenant_config.CACHE_MAX_ENTRIES", 2):
+            store.get("one")
+            store.get("two")
+            store.get("three")
+
+        with patch.object(TenantConfigStore, "_fetch", autospec=True) as fetch:
+            store.get("two")
+            store.get("three")
+            fetch.assert_not_called()
+            store.get("one")
+            fetch.assert_called_once()
+
+    def test_not_found_is_cached(self, dynamodb):
+        clock = [time.monotonic()]
+        store = TenantConfigStore(TABLE_NAME, dynamodb_resource=dynamodb, now_fn=lambda: clock[0])
         store.clear_cache()
 
+        assert store.get("late") is None
+        _put_tenant(dynamodb, "late")
+        assert store.get("late") is None  # negative cache still fresh
+
+        clock[0] += NEGATIVE_CACHE_TTL_SECONDS + 1
+        assert store.get("late") is not None
+
+    def test_dynamodb_read_outside_cache_lock(self, dynamodb, store):
+        _put_tenant(dynamodb, "a")
+        _put_tenant(dynamodb, "b")
+        lock_held = []
+        dynamodb.meta.client.meta.events.register(
+            "before-call.dynamodb", lambda **kwargs: lock_held.append(_cache_lock.locked())
+        )
+
+        store.preload()
+        store.get("missing")
+        store.get_many(["b", "other"])
+
+        assert lock_held == [False, False, False]
+
+    def test_disabled_tenant_cached_raises_on_second_call(self, dynamodb, store):
+        _put_tenant(dynamodb, "off", enabled=False)
+
         with pytest.raises(TenantDisabledError):
             store.get("off")
 